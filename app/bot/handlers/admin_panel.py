@@ -1,15 +1,22 @@
 from aiogram import Router, F
+from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from app.core.config import settings
 from app.services.subscription import SubscriptionService
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from app.bot.keyboards.user_keyboard import get_configuration_keyboard, get_admin_keyboard, get_start_keyboard, get_cancel_keyboard
-from app.services.vpn import VPNService
-import asyncio
+from app.database.metrics import pool_metrics
+from app.database.repositories.outbox_repo import OutboxRepository
+from app.services.inbound_cache import inbounds
+from app.services.provisioning import BulkProvisioner
+from app.services.rebalance import rebalancer
+from app.services.health import health_prober
+from app.services.panel_client import panel_clients
+from app.database.repositories.rebalance_repo import RebalanceRepository
+from app.database.repositories.broadcast_repo import AUDIENCES, BroadcastRepository
+from app.services.broadcast import broadcaster, throughput
 
 router = Router()
 
@@ -35,7 +42,7 @@ async def request_user_info(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AdminStates.waiting_for_user_id)
 
 @router.message(AdminStates.waiting_for_user_id)
-async def process_user_info(message: Message, state: FSMContext):
+async def process_user_info(message: Message, state: FSMContext, db: AsyncSession):
     if not is_admin(message.from_user.id):
         await message.answer("У вас нет прав для выполнения этой команды.")
         return
@@ -43,20 +50,21 @@ async def process_user_info(message: Message, state: FSMContext):
     try:
         telegram_id = int(message.text)
         
-        service = SubscriptionService()
+        service = SubscriptionService(db)
         user = await service.get_user_by_telegram_id(telegram_id)
         
         if not user:
             await message.answer(f"Пользователь с telegram_id {telegram_id} не найден.")
             return
 
+        server_ids = await service.get_user_server_ids(user)
         user_info_text = (
             f"ID: {user.id}\n"
             f"Telegram ID: {user.telegram_id}\n"
             f"Username: {user.username}\n"
             f"Subscription End: {user.subscription_end}\n"
             f"Status: {user.status}\n"
-            f"Server ID: {user.server_id}\n"
+            f"Server ID: {', '.join(map(str, server_ids)) or '-'}\n"
         )
         await message.answer(user_info_text, reply_markup=get_configuration_keyboard())
         
@@ -98,7 +106,7 @@ async def process_extend_id(message: Message, state: FSMContext):
         )
 
 @router.message(AdminStates.waiting_for_extend_months)
-async def process_extend_months(message: Message, state: FSMContext):
+async def process_extend_months(message: Message, state: FSMContext, db: AsyncSession):
     if not is_admin(message.from_user.id):
         await message.answer("У вас нет прав для выполнения этой команды.")
         return
@@ -116,7 +124,7 @@ async def process_extend_months(message: Message, state: FSMContext):
             await state.clear()
             return
 
-        service = SubscriptionService()
+        service = SubscriptionService(db)
         user = await service.get_user_by_telegram_id(telegram_id)
         
         if not user:
@@ -128,27 +136,16 @@ async def process_extend_months(message: Message, state: FSMContext):
             await message.answer("❌ Невозможно продлить подписку заблокированному пользователю.")
             return
 
-        current_expiration = user.subscription_end if user.subscription_end else datetime.now().date()
-        new_expiration = current_expiration + relativedelta(months=months)
+        # Истёкшему пользователю возвращаются места на его серверах, статус снова active
+        new_expiration = await service.renew(telegram_id, months)
 
-        from app.database.repositories.user_repo import UserRepository
-        user_repo = UserRepository(service.db)
-        success = user_repo.update_subscription(telegram_id, new_expiration)
-
-        if success:
-            try:
-                # Синхронизация с VPN API
-                await asyncio.to_thread(VPNService.syns_user, user)
-                await message.answer(
-                    f"✅ Подписка пользователя {telegram_id} продлена до {new_expiration.strftime('%d-%m-%Y')}.",
-                    reply_markup=get_configuration_keyboard()
-                )
-            except Exception as e:
-                print(f"Error syncing with VPN: {e}")
-                await message.answer(
-                    "⚠️ Подписка продлена, но возникла ошибка синхронизации с VPN.",
-                    reply_markup=get_configuration_keyboard()
-                )
+        if new_expiration:
+            # Синхронизация с VPN API идёт через очередь panel_outbox
+            await message.answer(
+                f"✅ Подписка пользователя {telegram_id} продлена до {new_expiration.strftime('%d-%m-%Y')}. "
+                "Синхронизация с VPN поставлена в очередь.",
+                reply_markup=get_configuration_keyboard()
+            )
         else:
             await message.answer("❌ Ошибка при продлении подписки.")
 
@@ -171,7 +168,7 @@ async def request_block_user(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AdminStates.waiting_for_block_id)
 
 @router.message(AdminStates.waiting_for_block_id)
-async def process_block_user(message: Message, state: FSMContext):
+async def process_block_user(message: Message, state: FSMContext, db: AsyncSession):
     if not is_admin(message.from_user.id):
         await message.answer("У вас нет прав для выполнения этой команды.")
         return
@@ -179,7 +176,7 @@ async def process_block_user(message: Message, state: FSMContext):
     try:
         telegram_id = int(message.text)
         
-        service = SubscriptionService()
+        service = SubscriptionService(db)
         user = await service.get_user_by_telegram_id(telegram_id)
         
         if not user:
@@ -191,30 +188,245 @@ async def process_block_user(message: Message, state: FSMContext):
             await message.answer("❌ Пользователь уже заблокирован.")
             return
 
-        user.status = "blocked"
-        service.db.commit()
-        
-        try:
-            # Синхронизация с VPN API
-            await asyncio.to_thread(VPNService.syns_user, user)
-            await message.answer(
-                f"✅ Пользователь {telegram_id} заблокирован.", 
-                reply_markup=get_configuration_keyboard()
-            )
-        except Exception as e:
-            print(f"Error syncing with VPN: {e}")
-            await message.answer(
-                "⚠️ Пользователь заблокирован, но возникла ошибка синхронизации с VPN.",
-                reply_markup=get_configuration_keyboard()
-            )
+        from app.database.repositories.user_repo import UserRepository
+        # Изменение статуса и задача синхронизации с VPN API фиксируются одной транзакцией
+        await UserRepository(service.db).set_status(user, "blocked")
+        await message.answer(
+            f"✅ Пользователь {telegram_id} заблокирован. Синхронизация с VPN поставлена в очередь.",
+            reply_markup=get_configuration_keyboard()
+        )
         
     except ValueError:
         await message.answer("Неверный формат ID. Пожалуйста, отправьте числовой ID.")
     finally:
         await state.clear()
 
-async def return_to_main_menu(message: Message, user_id: int):
-    service = SubscriptionService()
+@router.message(Command("pool"))
+async def pool_stats(message: Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    stats = pool_metrics.snapshot()
+    await message.answer("\n".join(f"{key}: {value}" for key, value in stats.items()))
+
+@router.message(Command("outbox"))
+async def outbox_stats(message: Message, db: AsyncSession):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    # Глубина очереди синхронизации с панелями и возраст самой старой записи
+    stats = await OutboxRepository(db).stats()
+    await message.answer("\n".join(f"{key}: {value}" for key, value in stats.items()))
+
+@router.message(Command("reset_inbounds"))
+async def reset_inbounds(message: Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    # После смены ключей reality на панели: /reset_inbounds <server_id> или без аргумента для всех серверов
+    args = message.text.split()[1:]
+    try:
+        server_id = int(args[0]) if args else None
+    except ValueError:
+        await message.answer("Неверный формат ID сервера.")
+        return
+    inbounds.invalidate(server_id)
+    await message.answer("✅ Кэш входящих подключений сброшен.")
+
+@router.message(Command("provision"))
+async def provision_server(message: Message, db: AsyncSession):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    # /provision <server_id> restore — пересоздать назначенных пользователей после переустановки панели
+    # /provision <server_id> onboard — заполнить новый сервер пользователями без сервера в его стране
+    args = message.text.split()[1:]
+    if len(args) != 2 or not args[0].isdigit() or args[1] not in ("restore", "onboard"):
+        await message.answer("Использование: /provision <server_id> restore|onboard")
+        return
+
+    provisioner = BulkProvisioner(settings.PROVISION_CHUNK_SIZE)
+    await message.answer("⏳ Создаём клиентов на сервере...")
+    if args[1] == "restore":
+        report = await provisioner.restore(db, int(args[0]))
+    else:
+        report = await provisioner.onboard(db, int(args[0]))
+
+    if report is None:
+        await message.answer(f"Сервер {args[0]} не найден.")
+        return
+    text = (
+        f"✅ Сервер {report.server_id}: создано {report.created} из {report.requested}, "
+        f"уже были на панели: {report.existing}, запросов к панели: {report.requests}."
+    )
+    if report.failed:
+        errors = "\n".join(f"{user_id}: {error}" for user_id, error in list(report.failed.items())[:10])
+        text += f"\n\n⚠️ Ошибки ({len(report.failed)}):\n{errors}"
+    await message.answer(text)
+
+@router.message(Command("rebalance"))
+async def create_rebalance_job(message: Message, db: AsyncSession):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    # /rebalance <source_id> <target_id[,target_id...]> [move|copy] [limit]
+    args = message.text.split()[1:]
+    try:
+        source_id = int(args[0])
+        target_ids = [int(target_id) for target_id in args[1].split(",")]
+        mode = args[2] if len(args) > 2 else "move"
+        user_limit = int(args[3]) if len(args) > 3 else None
+        if mode not in ("move", "copy") or source_id in target_ids:
+            raise ValueError
+    except (IndexError, ValueError):
+        await message.answer("Использование: /rebalance <source_id> <target_id[,target_id...]> [move|copy] [limit]")
+        return
+
+    job = await RebalanceRepository(db).create(source_id, target_ids, mode, user_limit)
+    rebalancer.wake()
+    await message.answer(f"✅ Задача переноса {job.id} создана. Прогресс: /jobs")
+
+@router.message(Command("jobs"))
+async def list_rebalance_jobs(message: Message, db: AsyncSession):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    jobs = await RebalanceRepository(db).recent()
+    if not jobs:
+        await message.answer("Задач переноса нет.")
+        return
+    lines = []
+    for job in jobs:
+        limit = f"/{job.user_limit}" if job.user_limit else ""
+        line = (
+            f"#{job.id} {job.mode} {job.source_server_id} -> {','.join(map(str, job.target_server_ids))}: "
+            f"{job.status}, обработано {job.processed}{limit}, ошибок {job.failed}"
+        )
+        if job.last_error:
+            line += f"\n  {job.last_error}"
+        lines.append(line)
+    await message.answer("\n".join(lines))
+
+@router.message(Command("job_cancel", "job_resume"))
+async def change_rebalance_job(message: Message, db: AsyncSession):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    args = message.text.split()
+    if len(args) != 2 or not args[1].isdigit():
+        await message.answer("Использование: /job_cancel <id> или /job_resume <id>")
+        return
+
+    # Продолжение идёт с сохранённого курсора
+    repo = RebalanceRepository(db)
+    if args[0].startswith("/job_resume"):
+        changed = await repo.resume(int(args[1]))
+        if changed:
+            rebalancer.wake()
+        await message.answer("✅ Готово." if changed else "Задача не найдена или не на паузе.")
+        return
+    changed = await repo.cancel(int(args[1]))
+    await message.answer("✅ Готово." if changed else "Задача не найдена или уже завершена.")
+
+@router.message(Command("broadcast"))
+async def create_broadcast(message: Message, db: AsyncSession):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    # /broadcast [all|active|inactive] <текст>; форматирование сообщения сохраняется
+    parts = message.html_text.split(maxsplit=1)
+    text = parts[1] if len(parts) > 1 else ""
+    audience = "all"
+    first = text.split(maxsplit=1)
+    if first and first[0] in AUDIENCES:
+        audience = first[0]
+        text = first[1] if len(first) > 1 else ""
+    if not text.strip():
+        await message.answer("Использование: /broadcast [all|active|inactive] <текст>")
+        return
+
+    broadcast = await BroadcastRepository(db).create(text, audience, message.from_user.id)
+    broadcaster.wake()
+    await message.answer(f"✅ Рассылка {broadcast.id} создана: {broadcast.total} получателей. Прогресс: /broadcasts")
+
+@router.message(Command("broadcasts"))
+async def list_broadcasts(message: Message, db: AsyncSession):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    broadcasts = await BroadcastRepository(db).recent()
+    if not broadcasts:
+        await message.answer("Рассылок нет.")
+        return
+    lines = []
+    for broadcast in broadcasts:
+        processed = broadcast.sent + broadcast.blocked + broadcast.failed
+        line = (
+            f"#{broadcast.id} {broadcast.audience}: {broadcast.status}, {processed}/{broadcast.total}, "
+            f"доставлено {broadcast.sent}, заблокировали {broadcast.blocked}, ошибок {broadcast.failed}, "
+            f"{throughput(broadcast):.1f} сообщений/с"
+        )
+        if broadcast.last_error:
+            line += f"\n  {broadcast.last_error}"
+        lines.append(line)
+    await message.answer("\n".join(lines))
+
+@router.message(Command("broadcast_cancel", "broadcast_resume"))
+async def change_broadcast(message: Message, db: AsyncSession):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    args = message.text.split()
+    if len(args) != 2 or not args[1].isdigit():
+        await message.answer("Использование: /broadcast_cancel <id> или /broadcast_resume <id>")
+        return
+
+    # Продолжение идёт с сохранённого курсора, уже получившие сообщение его не получат повторно
+    repo = BroadcastRepository(db)
+    if args[0].startswith("/broadcast_resume"):
+        changed = await repo.resume(int(args[1]))
+        if changed:
+            broadcaster.wake()
+        await message.answer("✅ Готово." if changed else "Рассылка не найдена или не на паузе.")
+        return
+    changed = await repo.cancel(int(args[1]))
+    await message.answer("✅ Готово." if changed else "Рассылка не найдена или уже завершена.")
+
+@router.message(Command("health"))
+async def server_health(message: Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    if not health_prober.servers:
+        await message.answer("Проверок ещё не было.")
+        return
+    lines = []
+    for server_id, health in sorted(health_prober.servers.items()):
+        latency = f"{health.latency * 1000:.0f} мс" if health.latency is not None else "—"
+        line = f"{'🟢' if health.healthy else '🔴'} {server_id}: {latency}, ошибок {health.error_rate:.0%}"
+        client = panel_clients.peek(server_id)
+        if client is not None:
+            line += f", лимит {int(client.limiter.limit)}, в очереди {client.limiter.queued}"
+            if client.breaker.state != "closed":
+                line += f", автомат {client.breaker.state}"
+        if not health.healthy and health.last_error:
+            line += f" ({health.last_error})"
+        lines.append(line)
+    await message.answer("\n".join(lines))
+
+async def return_to_main_menu(message: Message, user_id: int, db: AsyncSession):
+    service = SubscriptionService(db)
     status = await service.get_subscription_status(user_id)
     if user_id in settings.ADMIN_IDS:
         text, keyboard = get_admin_keyboard(status)
@@ -224,19 +436,19 @@ async def return_to_main_menu(message: Message, user_id: int):
 
 @router.message(Command("cancel"))
 @router.message(F.text.casefold() == "отмена")
-async def cancel_handler(message: Message, state: FSMContext):
+async def cancel_handler(message: Message, state: FSMContext, db: AsyncSession):
     current_state = await state.get_state()
     if current_state is None:
         return
 
     await state.clear()
-    await return_to_main_menu(message, message.from_user.id)
+    await return_to_main_menu(message, message.from_user.id, db)
     await message.answer("Действие отменено.")
 
 @router.callback_query(F.data == "cancel_action")
-async def cancel_action(callback: CallbackQuery, state: FSMContext):
+async def cancel_action(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     current_state = await state.get_state()
     if current_state is not None:
         await state.clear()
         await callback.answer("Действие отменено")
-        await return_to_main_menu(callback.message, callback.from_user.id) 
\ No newline at end of file
+        await return_to_main_menu(callback.message, callback.from_user.id, db) 
\ No newline at end of file
@@ -1,18 +1,18 @@
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, FSInputFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from aiogram.types import CallbackQuery
 from app.services.subscription import SubscriptionService
+from app.services.media import media, DASHBOARD_IMAGE
 from app.bot.keyboards.user_keyboard import get_start_keyboard, get_configuration_keyboard, get_admin_keyboard
-from app.database.repositories.server_repo import ServerRepository
-from app.database.connection import get_db
 from app.core.config import settings
 
 router = Router()
 
 @router.callback_query(F.data == "start_callback")
-async def start_button(callback: CallbackQuery):
+async def start_button(callback: CallbackQuery, db: AsyncSession):
 
 
-    service = SubscriptionService()
+    service = SubscriptionService(db)
     status = await service.get_subscription_status(callback.from_user.id)
     user = await service.get_user_by_telegram_id(callback.from_user.id)
 
@@ -22,8 +22,9 @@ async def start_button(callback: CallbackQuery):
         text, keyboard = get_start_keyboard(status,user)
 
     await callback.answer()
-    await callback.message.answer_photo(
-        photo=FSInputFile("app/images/TG_message_LC.png"),
+    await media.answer_photo(
+        callback.message,
+        DASHBOARD_IMAGE,
         caption=text,
         reply_markup=keyboard,
         parse_mode="HTML"
@@ -32,9 +33,9 @@ async def start_button(callback: CallbackQuery):
     
 
 @router.callback_query(F.data == "extend_subscription")
-async def extend_subscription_pay(callback: CallbackQuery):
+async def extend_subscription_pay(callback: CallbackQuery, db: AsyncSession):
     try:
-        service = SubscriptionService()
+        service = SubscriptionService(db)
         user = await service.get_user_by_telegram_id(callback.from_user.id)
 
         if not user:
@@ -59,9 +60,9 @@ async def extend_subscription_pay(callback: CallbackQuery):
         )
 
 @router.callback_query(F.data == "pay_subscription")
-async def pay_subscription(callback: CallbackQuery):
+async def pay_subscription(callback: CallbackQuery, db: AsyncSession):
     try:
-        service = SubscriptionService()
+        service = SubscriptionService(db)
         user = await service.get_user_by_telegram_id(callback.from_user.id)
 
         if not user:
@@ -97,8 +98,8 @@ async def pay_subscription(callback: CallbackQuery):
         )
 
 @router.callback_query(F.data == "get_configuration")
-async def get_configuration(callback: CallbackQuery):
-    service = SubscriptionService()
+async def get_configuration(callback: CallbackQuery, db: AsyncSession):
+    service = SubscriptionService(db)
     user = await service.get_user_by_telegram_id(callback.from_user.id)
     if not user:
         await callback.message.edit_text(
@@ -1,6 +1,8 @@
 from aiogram import Router, F
-from aiogram.types import Message, FSInputFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from aiogram.types import Message
 from app.services.subscription import SubscriptionService
+from app.services.media import media, DASHBOARD_IMAGE
 from app.bot.keyboards.user_keyboard import get_start_keyboard, get_admin_keyboard
 from app.core.config import settings
 
@@ -8,9 +10,9 @@ router = Router()
 
 
 @router.message(F.text == "/start")
-async def start_command(message: Message):
+async def start_command(message: Message, db: AsyncSession):
 
-    service = SubscriptionService()
+    service = SubscriptionService(db)
     user = await service.get_user_by_telegram_id(message.from_user.id)
     
     if not user:
@@ -25,8 +27,9 @@ async def start_command(message: Message):
     else:
         text, keyboard = get_start_keyboard(status, user)
     
-    await message.answer_photo(
-        photo=FSInputFile("app/images/TG_message_LC.png"),
+    await media.answer_photo(
+        message,
+        DASHBOARD_IMAGE,
         caption=text,
         reply_markup=keyboard,
         parse_mode="HTML"
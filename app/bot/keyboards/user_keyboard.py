@@ -1,5 +1,5 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from app.services.vpn import VPNService
+from app.web.subscription import subscription_url
 
 def get_start_keyboard(status, user):
 
@@ -18,7 +18,7 @@ def get_start_keyboard(status, user):
             f"🪙 Баланс: {0} рублей\n\n"
             f"🔑 Доступ к сервису:\n"
             f"Чтобы подключиться, просто перейдите по ссылке:\n\n"
-            f"➡️ https://ronix-red.ru/{user.id}\n\n"
+            f"➡️ {subscription_url(user.id)}\n\n"
             f"👆 Нажмите, чтобы открыть, или загляните в раздел 📖 «Помощь в подключении» — там есть инструкции по настройке.\n\n"
         )
     else:
@@ -34,6 +34,12 @@ def get_start_keyboard(status, user):
 
     return text, keyboard
 
+def get_reminder_keyboard():
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="Продлить подписку", callback_data="extend_subscription")]
+    ])
+    return keyboard
+
 def get_configuration_keyboard():
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="« Назад в меню:", callback_data="start_callback")]
@@ -59,7 +65,7 @@ def get_admin_keyboard(status, user):
             f"🪙 Баланс: {0} рублей\n\n"
             f"🔑 Доступ к сервису:\n"
             f"Чтобы подключиться, просто перейдите по ссылке:\n\n"
-            f"➡️ https://ronix-red.ru/{user.id}\n\n"
+            f"➡️ {subscription_url(user.id)}\n\n"
             f"👆 Нажмите, чтобы открыть, или загляните в раздел 📖 «Помощь в подключении» — там есть инструкции по настройке.\n\n"
         )
     else:
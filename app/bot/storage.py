@@ -0,0 +1,87 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import delete, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.database.models.models import FSMRecord
+
+
+class DatabaseStorage(BaseStorage):
+    """FSM-хранилище в PostgreSQL: общее для всех процессов бота, записи живут не дольше ttl"""
+
+    def __init__(self, session_pool: async_sessionmaker, ttl: float, key_builder: KeyBuilder | None = None):
+        self.session_pool = session_pool
+        self.ttl = timedelta(seconds=ttl)
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+    def _expires_at(self) -> datetime:
+        return datetime.utcnow() + self.ttl
+
+    def _alive(self):
+        return or_(FSMRecord.expires_at.is_(None), FSMRecord.expires_at > datetime.utcnow())
+
+    async def _upsert(self, key: StorageKey, **values):
+        values["expires_at"] = self._expires_at()
+        record_key = self.key_builder.build(key)
+        stmt = insert(FSMRecord).values(key=record_key, **values)
+        stmt = stmt.on_conflict_do_update(index_elements=[FSMRecord.key], set_=values)
+        async with self.session_pool() as session:
+            await session.execute(stmt)
+            # Пустые записи не храним, чтобы таблица не росла от завершённых диалогов
+            await session.execute(
+                delete(FSMRecord).where(
+                    FSMRecord.key == record_key,
+                    FSMRecord.state.is_(None),
+                    FSMRecord.data.is_(None),
+                )
+            )
+            await session.commit()
+
+    async def _get(self, key: StorageKey, column):
+        async with self.session_pool() as session:
+            result = await session.execute(
+                select(column).where(FSMRecord.key == self.key_builder.build(key), self._alive())
+            )
+            return result.scalar_one_or_none()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._upsert(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._get(key, FSMRecord.state)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        # Компактный JSON без пробелов и с кириллицей как есть
+        packed = json.dumps(data, separators=(",", ":"), ensure_ascii=False) if data else None
+        await self._upsert(key, data=packed)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        packed = await self._get(key, FSMRecord.data)
+        return json.loads(packed) if packed else {}
+
+    async def purge_expired(self) -> int:
+        async with self.session_pool() as session:
+            result = await session.execute(
+                delete(FSMRecord).where(FSMRecord.expires_at <= datetime.utcnow())
+            )
+            await session.commit()
+            return result.rowcount
+
+    async def run_purge_loop(self, interval: float):
+        """Фоновая очистка просроченных состояний"""
+        while True:
+            try:
+                purged = await self.purge_expired()
+                if purged:
+                    print(f"Удалено просроченных FSM-состояний: {purged}")
+            except Exception as e:
+                print(f"Ошибка очистки FSM-хранилища: {e}")
+            await asyncio.sleep(interval)
+
+    async def close(self) -> None:
+        # Сессии открываются на каждую операцию, закрывать нечего: движок закрывает main
+        pass
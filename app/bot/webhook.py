@@ -0,0 +1,37 @@
+import asyncio
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from app.core.config import settings
+from app.web.server import start_web_server
+
+
+def setup_webhook(app: web.Application, bot: Bot, dp: Dispatcher):
+    # handle_in_background: Telegram сразу получает 200, апдейты обрабатываются параллельно
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.WEBHOOK_SECRET,
+        handle_in_background=True,
+    ).register(app, path=settings.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, allowed_updates: list[str], app: web.Application):
+    """Принимает апдейты через вебхук до отмены задачи; app может уже содержать другие маршруты"""
+    if not settings.WEBHOOK_BASE_URL or not settings.WEBHOOK_SECRET:
+        raise ValueError("Для режима webhook нужны WEBHOOK_BASE_URL и WEBHOOK_SECRET")
+
+    setup_webhook(app, bot, dp)
+    runner = await start_web_server(app)
+    try:
+        # Несколько процессов за балансировщиком выставляют один и тот же URL — вызов идемпотентен
+        await bot.set_webhook(
+            url=f"{settings.WEBHOOK_BASE_URL.rstrip('/')}{settings.WEBHOOK_PATH}",
+            secret_token=settings.WEBHOOK_SECRET,
+            allowed_updates=allowed_updates,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -10,7 +10,114 @@ class Settings(BaseSettings):
     DB_USER: str = Field(...)
     DB_PASSWORD: str = Field(...)
 
-    VPN_TYPE: str = Field(default="H")
+    # Пул соединений: одна сессия на апдейт, поэтому размер пула ограничивает число апдейтов с запросами к БД
+    DB_POOL_SIZE: int = Field(default=5)
+    DB_MAX_OVERFLOW: int = Field(default=10)
+    DB_POOL_TIMEOUT: float = Field(default=30)
+
+    # Кэш пользователей по telegram_id; другие процессы увидят изменение не позже чем через TTL
+    USER_CACHE_TTL: float = Field(default=60)
+    USER_CACHE_SIZE: int = Field(default=10000)
+
+    # Тип панели для серверов без servers.panel_type: "3x-ui" или "hiddify" (допустимы старые "X" и "H")
+    VPN_TYPE: str = Field(default="3x-ui")
+
+    # Получение апдейтов: "polling" или "webhook" (локальный aiohttp-сервер за балансировщиком)
+    BOT_MODE: str = Field(default="polling")
+    WEBHOOK_BASE_URL: str | None = Field(default=None)  # Публичный адрес, например https://bot.example.com
+    WEBHOOK_PATH: str = Field(default="/webhook")
+    WEBHOOK_SECRET: str | None = Field(default=None)  # Проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_MAX_CONNECTIONS: int = Field(default=40)
+    # Локальный aiohttp-сервер: вебхук и ссылки подписки
+    WEB_HOST: str = Field(default="0.0.0.0")
+    WEB_PORT: int = Field(default=8080)
+
+    # Ссылки подписки: публичный адрес, путь на локальном сервере, кэш документов и интервал обновления в клиенте (часы)
+    SUBSCRIPTION_BASE_URL: str = Field(default="https://ronix-red.ru")
+    SUBSCRIPTION_PATH: str = Field(default="/sub")
+    SUBSCRIPTION_CACHE_TTL: float = Field(default=300)
+    SUBSCRIPTION_CACHE_SIZE: int = Field(default=10000)
+    SUBSCRIPTION_UPDATE_INTERVAL: int = Field(default=12)
+
+    # Хранилище FSM: "memory" — в памяти процесса, "db" — общее для процессов в PostgreSQL.
+    # aiogram читает состояние на каждом апдейте, поэтому "db" добавляет отдельное соединение и SELECT
+    # к каждому сообщению; включать, только когда бот запущен в нескольких процессах
+    FSM_STORAGE: str = Field(default="memory")
+    FSM_TTL: float = Field(default=86400)
+    FSM_PURGE_INTERVAL: float = Field(default=3600)
+
+    # HTTP-клиент панелей: таймаут запроса, размер пула и время жизни keep-alive соединений
+    PANEL_TIMEOUT: float = Field(default=30)
+    PANEL_POOL_LIMIT: int = Field(default=10)
+    PANEL_KEEPALIVE: float = Field(default=60)
+    PANEL_CONNECT_TIMEOUT: float = Field(default=5)
+    # Автомат панели: сколько ошибок подряд отключают сервер и через сколько секунд пробовать снова
+    PANEL_BREAKER_THRESHOLD: int = Field(default=5)
+    PANEL_BREAKER_RESET: float = Field(default=30)
+    # Адаптивный лимит параллельных запросов к панели: от PANEL_CONCURRENCY_MIN до PANEL_POOL_LIMIT,
+    # сверх лимита запросы ждут в очереди не длиннее PANEL_QUEUE_LIMIT
+    PANEL_CONCURRENCY_MIN: int = Field(default=1)
+    PANEL_QUEUE_LIMIT: int = Field(default=200)
+    # Дедлайн параллельной операции сразу на нескольких серверах
+    PANEL_FANOUT_TIMEOUT: float = Field(default=20)
+
+    # Выбор серверов: least_loaded, weighted или fill_first; период сверки снимка загрузки с БД
+    PLACEMENT_POLICY: str = Field(default="least_loaded")
+    PLACEMENT_REFRESH_INTERVAL: float = Field(default=60)
+    # Проверка доступности панелей: период, таймаут проверки, сколько неудач подряд выключают сервер
+    # и сколько успехов подряд возвращают, размер окна для доли ошибок
+    HEALTH_PROBE_INTERVAL: float = Field(default=30)
+    HEALTH_PROBE_TIMEOUT: float = Field(default=5)
+    HEALTH_FAILURE_THRESHOLD: int = Field(default=2)
+    HEALTH_RECOVERY_THRESHOLD: int = Field(default=2)
+    HEALTH_WINDOW: int = Field(default=20)
+    # Сверка current_users с назначениями; с RECONCILE_WITH_PANEL в отчёт добавляется число клиентов на панели
+    RECONCILE_INTERVAL: float = Field(default=300)
+    RECONCILE_WITH_PANEL: bool = Field(default=False)
+
+    # Отключение истёкших подписок: период, размер пачки, параллельных запросов на одну панель и дедлайн рассылки по панелям
+    EXPIRY_SWEEP_INTERVAL: float = Field(default=300)
+    EXPIRY_BATCH_SIZE: int = Field(default=500)
+    EXPIRY_PANEL_CONCURRENCY: int = Field(default=10)
+    EXPIRY_PUSH_TIMEOUT: float = Field(default=300)
+
+    # Массовое создание клиентов на панели (/provision): клиентов в одном запросе addClient
+    PROVISION_CHUNK_SIZE: int = Field(default=100)
+    # Перенос пользователей между серверами (/rebalance): размер пачки (точка продолжения после рестарта),
+    # параллельных удалений на панели источника, аренда задачи процессом и период опроса очереди задач
+    REBALANCE_BATCH_SIZE: int = Field(default=200)
+    REBALANCE_PANEL_CONCURRENCY: int = Field(default=5)
+    REBALANCE_LEASE: float = Field(default=300)
+    REBALANCE_POLL_INTERVAL: float = Field(default=30)
+    # Рассылки: не больше BROADCAST_RATE сообщений в секунду на бота (лимит Telegram — около 30),
+    # получатели читаются пачками, каждая пачка — точка продолжения после рестарта
+    BROADCAST_RATE: float = Field(default=25)
+    BROADCAST_BURST: int = Field(default=25)
+    BROADCAST_BATCH_SIZE: int = Field(default=500)
+    BROADCAST_CONCURRENCY: int = Field(default=25)
+    BROADCAST_MAX_RETRIES: int = Field(default=3)
+    BROADCAST_LEASE: float = Field(default=300)
+    BROADCAST_POLL_INTERVAL: float = Field(default=30)
+    # Напоминания о конце подписки: за сколько дней, на какой срок вперёд загружать расписание из БД
+    REMINDER_DAYS: list[int] = Field(default=[3, 1])
+    REMINDER_WINDOW: float = Field(default=3600)
+    REMINDER_BATCH_SIZE: int = Field(default=500)
+
+    # Очередь синхронизации с панелями: размер пачки, период опроса и экспоненциальная задержка повторов
+    OUTBOX_BATCH_SIZE: int = Field(default=100)
+    OUTBOX_POLL_INTERVAL: float = Field(default=5)
+    OUTBOX_BASE_BACKOFF: float = Field(default=5)
+    OUTBOX_MAX_BACKOFF: float = Field(default=600)
+
+    # Кэш токенов 3x-ui: время жизни и необязательный файл-снапшот для переживания рестарта
+    PANEL_TOKEN_TTL: float = Field(default=3000)
+    PANEL_TOKEN_CACHE_PATH: str | None = Field(default=None)
+
+    # Время жизни кэша параметров reality входящих подключений (ссылки vless строятся без запросов к панели)
+    INBOUND_CACHE_TTL: float = Field(default=3600)
+
+    # Файл с file_id загруженных в Telegram картинок (None — кэш только в памяти)
+    MEDIA_CACHE_PATH: str | None = Field(default="media_cache.json")
 
     # Новый список админов (здесь укажите свои telegram_id)
     ADMIN_IDS: list[int] = Field(default_factory=lambda: [683286025])
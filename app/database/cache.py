@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.core.config import settings
+from app.database.models.models import User
+
+
+class UserCache:
+    """LRU-кэш пользователей по telegram_id с TTL; хранит снимки колонок, а не объекты сессий"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[int, tuple[dict, float]] = OrderedDict()
+        # Растёт при каждой инвалидации: чтение, начатое до неё, не кладёт в кэш устаревшую строку
+        self.generation = 0
+
+    def get(self, telegram_id: int) -> dict | None:
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[telegram_id]
+            return None
+        self._entries.move_to_end(telegram_id)
+        return entry[0]
+
+    def put(self, user: User, generation: int):
+        if generation != self.generation:
+            return
+        snapshot = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        self._entries[user.telegram_id] = (snapshot, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user.telegram_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id: int | None = None):
+        self.generation += 1
+        if telegram_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(telegram_id, None)
+
+    @staticmethod
+    def restore(snapshot: dict) -> User:
+        """Detached-объект из снимка; в сессию добавляется через merge(load=False) без SELECT"""
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return user
+
+
+user_cache = UserCache(settings.USER_CACHE_TTL, settings.USER_CACHE_SIZE)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    # Любое ORM-изменение пользователя (продление, статус, оплата) сбрасывает его из кэша
+    changed = session.info.setdefault("changed_telegram_ids", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User) and obj.telegram_id is not None:
+            changed.add(obj.telegram_id)
+            user_cache.invalidate(obj.telegram_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    # Повторно после фиксации: между flush и commit другой апдейт мог закэшировать старую строку
+    for telegram_id in session.info.pop("changed_telegram_ids", ()):
+        user_cache.invalidate(telegram_id)
@@ -1,26 +1,31 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
 from app.core.config import settings
+from app.database.metrics import pool_metrics
 
-# Подключение к PostgreSQL
-DATABASE_URL = f"postgresql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+# Подключение к PostgreSQL через asyncpg, чтобы запросы не блокировали event loop
+DATABASE_URL = f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
+pool_metrics.attach(engine)
+# expire_on_commit=False: после commit атрибуты объектов остаются доступными без ленивой подгрузки
+AsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def init_db():
+async def init_db():
     # Импортируем модели здесь, чтобы избежать циклических импортов
-    from app.database.models.models import User, Payment, Server   # импортируйте все ваши модели
+    from app.database.models.models import User, Payment, Server, UserServer, PanelOutbox, RebalanceJob, Broadcast, FSMRecord   # импортируйте все ваши модели
+    from app.database.migrations import run_migrations
     
 
     # Создаем все таблицы
-    Base.metadata.create_all(bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
@@ -0,0 +1,58 @@
+import time
+from sqlalchemy import event
+
+
+class PoolMetrics:
+    """Счётчики выдачи соединений из пула для подбора DB_POOL_SIZE/DB_MAX_OVERFLOW"""
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.total_hold_time = 0.0
+        self.max_hold_time = 0.0
+
+    def attach(self, engine):
+        # Для AsyncEngine события пула вешаются на sync_engine
+        sync_engine = getattr(engine, "sync_engine", engine)
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "checkout", self._on_checkout)
+        event.listen(sync_engine, "checkin", self._on_checkin)
+        self._pool = sync_engine.pool
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        connection_record.info["checkout_at"] = time.monotonic()
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        checkout_at = connection_record.info.pop("checkout_at", None)
+        if checkout_at is None:
+            return
+        self.checkins += 1
+        self.in_use -= 1
+        hold_time = time.monotonic() - checkout_at
+        self.total_hold_time += hold_time
+        self.max_hold_time = max(self.max_hold_time, hold_time)
+
+    def snapshot(self) -> dict:
+        pool = getattr(self, "_pool", None)
+        return {
+            "pool_size": pool.size() if pool is not None else None,
+            "overflow": pool.overflow() if pool is not None else None,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "avg_hold_ms": round(self.total_hold_time / self.checkins * 1000, 1) if self.checkins else 0.0,
+            "max_hold_ms": round(self.max_hold_time * 1000, 1),
+        }
+
+
+pool_metrics = PoolMetrics()
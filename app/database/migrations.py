@@ -0,0 +1,69 @@
+from sqlalchemy import text
+from app.database.models.models import LOAD_RATIO_EXPRESSION
+
+# Идемпотентные шаги миграции: выполняются при каждом старте после create_all
+MIGRATIONS = [
+    # Перенос users.server_id ('{1,2}') в таблицу user_servers
+    """
+    INSERT INTO user_servers (user_id, server_id, created_at)
+    SELECT u.id, s.id, now()
+    FROM users u
+    CROSS JOIN LATERAL unnest(string_to_array(trim(both '{}' from u.server_id), ',')) AS sid(value)
+    JOIN servers s ON s.id = CASE WHEN trim(sid.value) ~ '^[0-9]+$' THEN trim(sid.value)::int END
+    WHERE u.server_id IS NOT NULL
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    UPDATE users SET server_id = NULL
+    WHERE server_id IS NOT NULL
+      AND id IN (SELECT user_id FROM user_servers)
+    """,
+    # Вычисляемая доля заполнения и индексы для выбора сервера
+    f"""
+    ALTER TABLE servers ADD COLUMN IF NOT EXISTS load_ratio double precision
+    GENERATED ALWAYS AS ({LOAD_RATIO_EXPRESSION}) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_servers_country_load_ratio ON servers (country, load_ratio, id)",
+    "CREATE INDEX IF NOT EXISTS ix_servers_load_ratio ON servers (load_ratio)",
+    # Тип панели на каждом сервере (драйверы app/services/panels). Существующие серверы обслуживал
+    # только клиент 3x-ui, поэтому при добавлении колонки они один раз помечаются как 3x-ui
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'servers' AND column_name = 'panel_type'
+        ) THEN
+            ALTER TABLE servers ADD COLUMN panel_type varchar;
+            UPDATE servers SET panel_type = '3x-ui';
+        END IF;
+    END $$
+    """,
+    # Признак доступности панели, который ведёт HealthProber
+    "ALTER TABLE servers ADD COLUMN IF NOT EXISTS is_healthy boolean NOT NULL DEFAULT true",
+    "CREATE INDEX IF NOT EXISTS ix_users_status_subscription_end ON users (status, subscription_end)",
+    # Напоминания о конце подписки. При добавлении колонки активным подпискам один раз назначается ближайшее
+    # напоминание по умолчанию (за 3 и за 1 день); дальше его ведёт ReminderRepository
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'next_reminder_at'
+        ) THEN
+            ALTER TABLE users ADD COLUMN next_reminder_at timestamp;
+            UPDATE users SET next_reminder_at = CASE
+                WHEN subscription_end - interval '3 days' > now() AT TIME ZONE 'utc' THEN subscription_end - interval '3 days'
+                ELSE subscription_end - interval '1 day'
+            END
+            WHERE status = 'active' AND subscription_end - interval '1 day' > now() AT TIME ZONE 'utc';
+        END IF;
+    END $$
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_users_next_reminder_at ON users (next_reminder_at) WHERE next_reminder_at IS NOT NULL",
+]
+
+
+async def run_migrations(conn):
+    for statement in MIGRATIONS:
+        await conn.execute(text(statement))
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, BigInteger
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, BigInteger, Text, Float, Computed, Index, Boolean, true, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
 import uuid
 from app.database.connection import Base
 from datetime import datetime
@@ -12,8 +12,18 @@ class User(Base):
     username = Column(String, nullable=True)
     subscription_end = Column(DateTime, nullable=True)  # Изменено с Date на DateTime
     status = Column(String, default='inactive')
-    server_id = Column(String, nullable=True)  
+    server_id = Column(String, nullable=True)  # Устарело: назначения хранятся в user_servers, миграция переносит старые значения
+    next_reminder_at = Column(DateTime, nullable=True)  # Следующее напоминание о конце подписки; NULL — не нужно
 
+    __table_args__ = (
+        # Поиск истёкших подписок: status = 'active' AND subscription_end < now
+        Index("ix_users_status_subscription_end", "status", "subscription_end"),
+        # Окно ближайших напоминаний; в индекс попадают только запланированные
+        Index("ix_users_next_reminder_at", "next_reminder_at", postgresql_where=text("next_reminder_at IS NOT NULL")),
+    )
+
+
+LOAD_RATIO_EXPRESSION = "COALESCE(current_users, 0)::double precision / NULLIF(max_users, 0)"
 
 class Server(Base):
     __tablename__ = "servers"
@@ -29,6 +39,68 @@ class Server(Base):
     api = Column(String, nullable=False)  # API key для админа
     user_api = Column(String, nullable=True)  # API key для пользователя
     country = Column(String, nullable=False)
+    panel_type = Column(String, nullable=True)  # "3x-ui" или "hiddify"; NULL — тип из Settings.VPN_TYPE
+    is_healthy = Column(Boolean, nullable=False, default=True, server_default=true())  # Ставит фоновый HealthProber; нездоровые не выбираются
+    # Доля заполнения, считается самим PostgreSQL; по ней индексируется выбор сервера
+    load_ratio = Column(Float, Computed(LOAD_RATIO_EXPRESSION, persisted=True))
+
+    __table_args__ = (
+        Index("ix_servers_country_load_ratio", "country", "load_ratio", "id"),
+        Index("ix_servers_load_ratio", "load_ratio"),
+    )
+
+class UserServer(Base):
+    __tablename__ = "user_servers"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    server_id = Column(Integer, ForeignKey('servers.id', ondelete='CASCADE'), primary_key=True, index=True)  # Индекс для выборок "все пользователи сервера"
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class PanelOutbox(Base):
+    __tablename__ = "panel_outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+
+class RebalanceJob(Base):
+    __tablename__ = "rebalance_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source_server_id = Column(Integer, ForeignKey('servers.id', ondelete='CASCADE'), nullable=False)
+    target_server_ids = Column(ARRAY(Integer), nullable=False)
+    mode = Column(String, nullable=False, default='move')  # move — перенести, copy — добавить на целевые серверы
+    user_limit = Column(Integer, nullable=True)  # Сколько пользователей обработать; NULL — всех
+    status = Column(String, nullable=False, default='pending', index=True)  # pending, running, paused, done, cancelled
+    cursor = Column(UUID(as_uuid=True), nullable=True)  # Последний обработанный users.id: точка продолжения после рестарта
+    processed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # Аренда задачи одним процессом
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    text = Column(Text, nullable=False)  # HTML, как его прислал администратор
+    audience = Column(String, nullable=False, default='all')  # all, active или inactive
+    status = Column(String, nullable=False, default='pending', index=True)  # pending, running, paused, done, cancelled
+    total = Column(Integer, nullable=False, default=0)  # Получателей на момент создания
+    cursor = Column(UUID(as_uuid=True), nullable=True)  # Последний обработанный users.id
+    sent = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)  # Бот заблокирован или аккаунт удалён
+    failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # Аренда рассылки одним процессом
+    created_by = Column(BigInteger, nullable=True)  # telegram_id администратора
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Payment(Base):
     __tablename__ = "payments"
@@ -37,4 +109,12 @@ class Payment(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
     amount = Column(Integer, nullable=False)
     status = Column(String, nullable=False)
-    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Изменено с Date на DateTime
\ No newline at end of file
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Изменено с Date на DateTime
+
+class FSMRecord(Base):
+    __tablename__ = "fsm_storage"
+
+    key = Column(String, primary_key=True)  # Ключ из KeyBuilder aiogram
+    state = Column(String, nullable=True)
+    data = Column(Text, nullable=True)  # Компактный JSON
+    expires_at = Column(DateTime, nullable=True, index=True)
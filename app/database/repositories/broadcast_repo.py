@@ -0,0 +1,66 @@
+from app.database.models.models import Broadcast, User
+from app.database.repositories.job_repo import JobRepository
+from sqlalchemy import func, or_, select, update
+from datetime import datetime, timedelta
+
+AUDIENCES = ("all", "active", "inactive")
+
+def audience_filter(audience: str):
+    if audience == "active":
+        return User.status == "active"
+    if audience == "inactive":
+        return or_(User.status.is_(None), User.status != "active")
+    return None
+
+class BroadcastRepository(JobRepository):
+    model = Broadcast
+
+    async def count_recipients(self, audience: str) -> int:
+        query = select(func.count()).select_from(User)
+        condition = audience_filter(audience)
+        if condition is not None:
+            query = query.where(condition)
+        return (await self.db.execute(query)).scalar()
+
+    async def create(self, text: str, audience: str, created_by: int):
+        broadcast = Broadcast(
+            text=text,
+            audience=audience,
+            total=await self.count_recipients(audience),
+            created_by=created_by
+        )
+        self.db.add(broadcast)
+        await self.db.commit()
+        return broadcast
+
+    def claim_values(self, now: datetime) -> dict:
+        return {"started_at": func.coalesce(Broadcast.started_at, now)}
+
+    async def next_recipients(self, broadcast, limit: int) -> list[tuple]:
+        """Следующие (users.id, telegram_id) после курсора; ORM-объекты пользователей не создаются"""
+        query = select(User.id, User.telegram_id)
+        condition = audience_filter(broadcast.audience)
+        if condition is not None:
+            query = query.where(condition)
+        if broadcast.cursor is not None:
+            query = query.where(User.id > broadcast.cursor)
+        result = await self.db.execute(query.order_by(User.id).limit(limit))
+        return [tuple(row) for row in result.all()]
+
+    async def checkpoint(self, broadcast, cursor, sent: int, blocked: int, failed: int, lease: float,
+                         error: str | None):
+        """Сохраняет курсор и счётчики после пачки и продлевает аренду"""
+        await self.db.execute(
+            update(Broadcast).where(
+                Broadcast.id == broadcast.id
+            ).values(
+                cursor=cursor,
+                sent=Broadcast.sent + sent,
+                blocked=Broadcast.blocked + blocked,
+                failed=Broadcast.failed + failed,
+                last_error=error if error else Broadcast.last_error,
+                locked_until=datetime.utcnow() + timedelta(seconds=lease),
+                updated_at=datetime.utcnow()
+            )
+        )
+        await self.db.commit()
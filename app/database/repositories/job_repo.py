@@ -0,0 +1,96 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, select, update
+from datetime import datetime, timedelta
+
+class JobRepository:
+    """Общая часть очередей задач в таблице: аренда, статус и чтение
+
+    Таблица задачи (model) должна иметь status, locked_until и updated_at."""
+    model = None
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def claim_values(self, now: datetime) -> dict:
+        # Дополнительные поля, которые задача получает при взятии в работу
+        return {}
+
+    async def claim(self, lease: float):
+        """Берёт в работу одну незавершённую задачу, аренда которой свободна или истекла"""
+        model = self.model
+        now = datetime.utcnow()
+        candidate = select(model.id).where(
+            model.status.in_(('pending', 'running')),
+            or_(model.locked_until.is_(None), model.locked_until < now)
+        ).order_by(model.id).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+        result = await self.db.execute(
+            update(model).where(
+                model.id == candidate
+            ).values(
+                status='running',
+                locked_until=now + timedelta(seconds=lease),
+                **self.claim_values(now)
+            ).returning(model)
+        )
+        job = result.scalars().first()
+        await self.db.commit()
+        return job
+
+    async def get(self, job_id: int):
+        return await self.db.get(self.model, job_id, populate_existing=True)
+
+    async def recent(self, limit: int = 5):
+        result = await self.db.execute(select(self.model).order_by(self.model.id.desc()).limit(limit))
+        return result.scalars().all()
+
+    async def set_status(self, job_id: int, status: str, error: str | None = None) -> bool:
+        """Итог задачи от процесса, который её выполняет: статус и снятие аренды"""
+        model = self.model
+        result = await self.db.execute(
+            update(model).where(
+                model.id == job_id,
+                model.status.in_(('pending', 'running', 'paused'))
+            ).values(
+                status=status,
+                last_error=error,
+                locked_until=None,
+                updated_at=datetime.utcnow()
+            ).returning(model.id)
+        )
+        changed = result.scalar() is not None
+        await self.db.commit()
+        return changed
+
+    async def resume(self, job_id: int) -> bool:
+        """Возвращает в очередь только задачу на паузе: у running аренду держит процесс, который её выполняет"""
+        model = self.model
+        result = await self.db.execute(
+            update(model).where(
+                model.id == job_id,
+                model.status == 'paused'
+            ).values(
+                status='pending',
+                last_error=None,
+                locked_until=None,
+                updated_at=datetime.utcnow()
+            ).returning(model.id)
+        )
+        changed = result.scalar() is not None
+        await self.db.commit()
+        return changed
+
+    async def cancel(self, job_id: int) -> bool:
+        """Отмена из админки; аренду не трогаем — выполняющий процесс увидит статус перед следующим шагом"""
+        model = self.model
+        result = await self.db.execute(
+            update(model).where(
+                model.id == job_id,
+                model.status.in_(('pending', 'running', 'paused'))
+            ).values(
+                status='cancelled',
+                updated_at=datetime.utcnow()
+            ).returning(model.id)
+        )
+        changed = result.scalar() is not None
+        await self.db.commit()
+        return changed
@@ -0,0 +1,64 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.models.models import PanelOutbox
+from sqlalchemy import delete, func, insert, select, update
+from datetime import datetime, timedelta
+
+class OutboxRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def enqueue(self, user_id):
+        # Без commit: запись фиксируется в одной транзакции с изменением пользователя
+        self.db.add(PanelOutbox(user_id=user_id))
+        # Флаг читает обработчик after_commit, чтобы разбудить воркер сразу после фиксации
+        self.db.info["outbox_pending"] = True
+
+    async def enqueue_many(self, user_ids: list, delay: float = 0) -> dict:
+        """Пачка записей одним INSERT без commit; delay откладывает их для воркера
+
+        Возвращает {user_id: id записи}, чтобы быстрый путь мог удалить записи тех, кого обработал сам."""
+        if not user_ids:
+            return {}
+        next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        result = await self.db.execute(
+            insert(PanelOutbox).values(
+                [{"user_id": user_id, "next_attempt_at": next_attempt_at} for user_id in user_ids]
+            ).returning(PanelOutbox.user_id, PanelOutbox.id)
+        )
+        return dict(result.all())
+
+    async def fetch_due(self, limit: int):
+        # SKIP LOCKED: несколько процессов разбирают очередь, не мешая друг другу
+        result = await self.db.execute(
+            select(PanelOutbox).where(
+                PanelOutbox.next_attempt_at <= datetime.utcnow()
+            ).order_by(
+                PanelOutbox.id
+            ).limit(limit).with_for_update(skip_locked=True)
+        )
+        return result.scalars().all()
+
+    async def delete(self, ids: list[int]):
+        await self.db.execute(delete(PanelOutbox).where(PanelOutbox.id.in_(ids)))
+
+    async def reschedule(self, ids: list[int], delay: float, error: str):
+        await self.db.execute(
+            update(PanelOutbox).where(
+                PanelOutbox.id.in_(ids)
+            ).values(
+                attempts=PanelOutbox.attempts + 1,
+                next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+                last_error=error
+            )
+        )
+
+    async def stats(self) -> dict:
+        result = await self.db.execute(
+            select(func.count(PanelOutbox.id), func.min(PanelOutbox.created_at), func.max(PanelOutbox.attempts))
+        )
+        depth, oldest, max_attempts = result.one()
+        return {
+            "depth": depth,
+            "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+            "max_attempts": max_attempts or 0,
+        }
@@ -0,0 +1,115 @@
+from app.database.models.models import RebalanceJob, Server, User, UserServer
+from app.database.repositories.job_repo import JobRepository
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timedelta
+
+class RebalanceRepository(JobRepository):
+    model = RebalanceJob
+
+    async def create(self, source_server_id: int, target_server_ids: list[int], mode: str, user_limit: int | None):
+        job = RebalanceJob(
+            source_server_id=source_server_id,
+            target_server_ids=target_server_ids,
+            mode=mode,
+            user_limit=user_limit
+        )
+        self.db.add(job)
+        await self.db.commit()
+        return job
+
+    async def next_batch(self, job, limit: int):
+        """Следующие пользователи источника после курсора (keyset по users.id)"""
+        query = select(User).join(UserServer, UserServer.user_id == User.id).where(
+            UserServer.server_id == job.source_server_id
+        )
+        if job.cursor is not None:
+            query = query.where(User.id > job.cursor)
+        result = await self.db.execute(query.order_by(User.id).limit(limit))
+        return result.scalars().all()
+
+    async def assigned_pairs(self, user_ids: list, server_ids: list[int]) -> set:
+        result = await self.db.execute(
+            select(UserServer.user_id, UserServer.server_id).where(
+                UserServer.user_id.in_(user_ids),
+                UserServer.server_id.in_(server_ids)
+            )
+        )
+        return {(user_id, server_id) for user_id, server_id in result.all()}
+
+    async def assign_batch(self, placed: dict[int, list], reserved: dict[int, int], holding: set) -> dict[int, int]:
+        """Назначения на целевые серверы; места заняты заранее для holding, неиспользованные освобождаются
+
+        Возвращает, на сколько изменился current_users каждого сервера относительно резерва."""
+        rows = [
+            {"user_id": user_id, "server_id": server_id}
+            for server_id, user_ids in placed.items() for user_id in user_ids
+        ]
+        assigned = {}
+        if rows:
+            result = await self.db.execute(
+                insert(UserServer).values(rows).on_conflict_do_nothing().returning(
+                    UserServer.user_id, UserServer.server_id
+                )
+            )
+            for user_id, server_id in result.all():
+                if user_id in holding:
+                    assigned[server_id] = assigned.get(server_id, 0) + 1
+
+        unused = {
+            server_id: count - assigned.get(server_id, 0)
+            for server_id, count in reserved.items() if count > assigned.get(server_id, 0)
+        }
+        if unused:
+            servers = Server.__table__
+            await self.db.execute(
+                servers.update().where(
+                    servers.c.id == bindparam("server_id")
+                ).values(
+                    current_users=func.greatest(servers.c.current_users - bindparam("unused"), 0)
+                ),
+                [{"server_id": server_id, "unused": count} for server_id, count in unused.items()]
+            )
+        await self.db.commit()
+        return {server_id: -count for server_id, count in unused.items()}
+
+    async def finish_batch(self, job, released: list, holding: set, cursor, processed: int, failed: int,
+                           lease: float, error: str | None) -> int:
+        """Одной транзакцией: снятие назначений с источника, его current_users и курсор задачи
+
+        Вызывается после assign_batch и удаления с панели источника: если процесс упадёт раньше,
+        пачка повторится, а уже назначенные пользователи будут пропущены. Возвращает, сколько мест
+        освободилось на источнике: их занимали только пользователи из holding."""
+        removed = 0
+        if released:
+            result = await self.db.execute(
+                delete(UserServer).where(
+                    UserServer.server_id == job.source_server_id,
+                    UserServer.user_id.in_(released)
+                ).returning(UserServer.user_id)
+            )
+            removed = sum(1 for user_id in result.scalars().all() if user_id in holding)
+        if removed:
+            await self.db.execute(
+                update(Server).where(
+                    Server.id == job.source_server_id
+                ).values(
+                    current_users=func.greatest(func.coalesce(Server.current_users, 0) - removed, 0)
+                ),
+                execution_options={"synchronize_session": False}
+            )
+
+        await self.db.execute(
+            update(RebalanceJob).where(
+                RebalanceJob.id == job.id
+            ).values(
+                cursor=cursor,
+                processed=RebalanceJob.processed + processed,
+                failed=RebalanceJob.failed + failed,
+                last_error=error if error else RebalanceJob.last_error,
+                locked_until=datetime.utcnow() + timedelta(seconds=lease),
+                updated_at=datetime.utcnow()
+            )
+        )
+        await self.db.commit()
+        return removed
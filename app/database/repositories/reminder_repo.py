@@ -0,0 +1,76 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.database.models.models import User
+from sqlalchemy import bindparam, select, tuple_, update
+from datetime import date, datetime, timedelta
+
+def next_reminder_at(subscription_end, now: datetime) -> datetime | None:
+    """Ближайшее будущее напоминание из REMINDER_DAYS дней до конца подписки"""
+    if subscription_end is None:
+        return None
+    if not isinstance(subscription_end, datetime) and isinstance(subscription_end, date):
+        subscription_end = datetime.combine(subscription_end, datetime.min.time())
+    upcoming = [subscription_end - timedelta(days=days) for days in settings.REMINDER_DAYS]
+    upcoming = [moment for moment in upcoming if moment > now]
+    return min(upcoming) if upcoming else None
+
+class ReminderRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def schedule(self, user: User):
+        # Без commit: дата напоминания фиксируется вместе с подпиской, планировщик узнаёт о ней в after_commit
+        user.next_reminder_at = (
+            next_reminder_at(user.subscription_end, datetime.utcnow()) if user.status == 'active' else None
+        )
+        self.db.info.setdefault("reminders_changed", {})[user.id] = user.next_reminder_at
+
+    async def due_before(self, horizon: datetime) -> list[tuple]:
+        """(users.id, next_reminder_at) всех напоминаний до horizon, включая просроченные; читается частичный индекс"""
+        result = await self.db.execute(
+            select(User.id, User.next_reminder_at).where(
+                User.next_reminder_at.is_not(None),
+                User.next_reminder_at <= horizon
+            )
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def claim(self, entries: list[tuple], now: datetime) -> list[tuple]:
+        """Забирает напоминания, чья дата не менялась, и назначает следующие; возвращает кому отправить
+
+        Отправка после фиксации: при сбое напоминание теряется, но не дублируется."""
+        result = await self.db.execute(
+            update(User).where(
+                tuple_(User.id, User.next_reminder_at).in_(entries)
+            ).values(
+                next_reminder_at=None
+            ).returning(User.id, User.telegram_id, User.subscription_end, User.status),
+            execution_options={"synchronize_session": False}
+        )
+        claimed = [
+            (user_id, telegram_id, subscription_end)
+            for user_id, telegram_id, subscription_end, status in result.all()
+            # Истёкшие и отключённые подписки только снимаются с расписания
+            if status == 'active' and subscription_end and subscription_end > now
+        ]
+
+        following = [
+            {"user_id": user_id, "next_at": next_reminder_at(subscription_end, now)}
+            for user_id, _, subscription_end in claimed
+        ]
+        following = [row for row in following if row["next_at"] is not None]
+        if following:
+            users = User.__table__
+            await self.db.execute(
+                users.update().where(
+                    users.c.id == bindparam("user_id")
+                ).values(
+                    next_reminder_at=bindparam("next_at")
+                ),
+                following
+            )
+        self.db.info.setdefault("reminders_changed", {}).update(
+            {row["user_id"]: row["next_at"] for row in following}
+        )
+        await self.db.commit()
+        return claimed
@@ -1,103 +1,179 @@
-from sqlalchemy.orm import Session
-from app.database.models.models import Server
-from sqlalchemy import func, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.models.models import Server, UserServer
+from sqlalchemy import bindparam, delete, func, select, true, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert
 
 class ServerRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_free_server(self):
-        return self.db.query(Server).filter(
-            Server.current_users < Server.max_users
-        ).order_by(
-            func.cast(Server.current_users, Float) / func.cast(Server.max_users, Float)
-        ).first()
+    async def get_free_server(self):
+        # load_ratio < 1 равносильно current_users < max_users, но идёт по индексу ix_servers_load_ratio;
+        # недоступные по данным HealthProber серверы не предлагаем
+        result = await self.db.execute(
+            select(Server).where(
+                Server.load_ratio < 1,
+                Server.is_healthy.is_(True)
+            ).order_by(
+                Server.load_ratio, Server.id
+            ).limit(1)
+        )
+        return result.scalars().first()
     
-    def get_two_different_country_servers(self):   
-        # Выбираем все свободные сервера, сортируя их по отношению текущих пользователей к максимальному количеству
-        free_servers = self.db.query(Server).filter(
-            Server.current_users < Server.max_users
+    async def get_two_different_country_servers(self):   
+        # Наименее нагруженный свободный сервер в каждой стране: для каждой страны отдельный
+        # LIMIT 1 по индексу (country, load_ratio, id) вместо сортировки всего парка
+        countries = select(Server.country).distinct().subquery("countries")
+        best = select(Server).where(
+            Server.country == countries.c.country,
+            Server.load_ratio < 1,
+            Server.is_healthy.is_(True)
         ).order_by(
-            func.cast(Server.current_users, Float) / func.cast(Server.max_users, Float)
-        ).all()
-
-        # Для каждой страны выбираем первый (наименее нагруженный) сервер
-        selected_servers = {}
-        for server in free_servers:
-            if server.country not in selected_servers:
-                selected_servers[server.country] = server
+            Server.load_ratio, Server.id
+        ).limit(1).lateral("best")
+        best_server = aliased(Server, best)
+        result = await self.db.execute(
+            select(best_server).select_from(countries).join(best, true()).order_by(best.c.country)
+        )
+        return result.scalars().all()
 
-        # Возвращаем список серверов, по одному для каждой страны
-        return list(selected_servers.values())
-
- 
-    def get_server_by_id(self, server_id):
-        print(f"Debug - received server_id: {server_id}, type: {type(server_id)}")  # Отладочная информация
-        
-        # Если server_id это строка в формате PostgreSQL массива
-        if isinstance(server_id, str):
-            # Убираем фигурные скобки и пробелы, затем разбиваем по запятой
-            cleaned_str = server_id.strip('{}').strip()
-            if not cleaned_str:  # Если строка пустая после очистки
-                print(f"Warning: Empty server_id after cleaning: {server_id}")
-                return None
-                
-            try:
-                # Проверяем, является ли строка одиночным числом
-                if cleaned_str.isdigit():
-                    return self.db.query(Server).filter(Server.id == int(cleaned_str)).first()
-                
-                # Преобразуем строку '{1,2,3}' в список [1,2,3]
-                id_list = [int(x.strip()) for x in cleaned_str.split(',') if x.strip()]
-                if not id_list:  # Если список пустой
-                    print(f"Warning: No valid IDs found in: {server_id}")
-                    return None
-                    
-                print(f"Debug - parsed id_list: {id_list}")  # Отладочная информация
-                return self.db.query(Server).filter(Server.id.in_(id_list)).all()
-                
-            except ValueError as e:
-                print(f"Error parsing server_id: {server_id}, error: {e}")
-                return None
-                
+    async def get_server_by_id(self, server_id):
         # Если server_id это список
-        elif isinstance(server_id, list):
+        if isinstance(server_id, list):
             if not server_id:  # Если список пустой
                 print("Warning: Empty server_id list")
                 return None
-            return self.db.query(Server).filter(Server.id.in_(server_id)).all()
+            result = await self.db.execute(select(Server).where(Server.id.in_(server_id)))
+            return result.scalars().all()
             
         # Если server_id это одиночное значение
         elif isinstance(server_id, (int, float)):
-            return self.db.query(Server).filter(Server.id == int(server_id)).first()
+            return await self.db.get(Server, int(server_id))
             
         print(f"Warning: Unsupported server_id type: {type(server_id)}")
         return None
 
-    def update_server_users(self, server_id: str, increment: bool = True):
-        # Если server_id это список
-        if isinstance(server_id, list):
-            servers = self.get_server_by_id(server_id)
-            success = True
-            for server in servers:
-                if increment and server.current_users < server.max_users:
-                    server.current_users += 1
-                elif not increment and server.current_users > 0:
-                    server.current_users -= 1
-                else:
-                    success = False
-            self.db.commit()
-            return success
-        else:
-            # Если server_id это одиночное значение
-            server = self.get_server_by_id(server_id)
-            if server:
-                if increment and server.current_users < server.max_users:
-                    server.current_users += 1
-                elif not increment and server.current_users > 0:
-                    server.current_users -= 1
-                self.db.commit()
-                return True
-            return False
+    async def get_user_servers(self, user_id):
+        # Индексированный join по user_servers вместо разбора строки '{1,2}'
+        result = await self.db.execute(
+            select(Server).join(UserServer, UserServer.server_id == Server.id).where(
+                UserServer.user_id == user_id
+            ).order_by(Server.id)
+        )
+        return result.scalars().all()
+
+    async def is_assigned(self, user_id, server_id: int) -> bool:
+        # Поиск по первичному ключу user_servers
+        return await self.db.get(UserServer, (user_id, server_id)) is not None
+
+    async def assign_servers(self, user_id, server_ids: list[int]):
+        if not server_ids:
+            return
+        await self.db.execute(
+            insert(UserServer).values(
+                [{"user_id": user_id, "server_id": server_id} for server_id in server_ids]
+            ).on_conflict_do_nothing()
+        )
+        await self.db.commit()
+
+    async def unassign_servers(self, user_id, server_ids: list[int]):
+        if not server_ids:
+            return
+        await self.db.execute(
+            delete(UserServer).where(
+                UserServer.user_id == user_id,
+                UserServer.server_id.in_(server_ids)
+            )
+        )
+        await self.db.commit()
+
+    async def assign_users(self, server_id: int, user_ids: list):
+        """Назначает серверу сразу много пользователей одним INSERT"""
+        if not user_ids:
+            return
+        await self.db.execute(
+            insert(UserServer).values(
+                [{"user_id": user_id, "server_id": server_id} for user_id in user_ids]
+            ).on_conflict_do_nothing()
+        )
+        await self.db.commit()
+
+    async def reserve_slots(self, server_ids: list[int]) -> list[int]:
+        """Атомарно занимает по месту на каждом сервере одним UPDATE; возвращает id, где место нашлось"""
+        if not server_ids:
+            return []
+        result = await self.db.execute(
+            update(Server).where(
+                Server.id.in_(server_ids),
+                Server.current_users < Server.max_users
+            ).values(
+                current_users=Server.current_users + 1
+            ).returning(Server.id)
+        )
+        reserved = list(result.scalars().all())
+        # Фиксируем сразу, чтобы не держать блокировки строк во время запросов к панелям
+        await self.db.commit()
+        return reserved
+
+    async def reserve_count(self, server_id: int, count: int) -> bool:
+        """Занимает сразу count мест на одном сервере, если они все свободны"""
+        if count <= 0:
+            return True
+        result = await self.db.execute(
+            update(Server).where(
+                Server.id == server_id,
+                Server.current_users + count <= Server.max_users
+            ).values(
+                current_users=Server.current_users + count
+            ).returning(Server.id)
+        )
+        reserved = result.scalar() is not None
+        await self.db.commit()
+        return reserved
+
+    async def release_slots(self, server_ids: list[int]) -> list[int]:
+        """Освобождает по месту на каждом сервере одним UPDATE"""
+        if not server_ids:
+            return []
+        result = await self.db.execute(
+            update(Server).where(
+                Server.id.in_(server_ids),
+                Server.current_users > 0
+            ).values(
+                current_users=Server.current_users - 1
+            ).returning(Server.id)
+        )
+        released = list(result.scalars().all())
+        await self.db.commit()
+        return released
+
+    async def release_counts(self, counts: dict[int, int]):
+        """Освобождает по нескольку мест на серверах одним executemany"""
+        if not counts:
+            return
+        servers = Server.__table__
+        await self.db.execute(
+            servers.update().where(
+                servers.c.id == bindparam("server_id")
+            ).values(
+                current_users=func.greatest(servers.c.current_users - bindparam("released"), 0)
+            ),
+            [{"server_id": server_id, "released": count} for server_id, count in counts.items()]
+        )
+        await self.db.commit()
 
-    
\ No newline at end of file
+    async def set_health(self, health: dict[int, bool]):
+        """Записывает доступность серверов одним executemany"""
+        if not health:
+            return
+        servers = Server.__table__
+        await self.db.execute(
+            servers.update().where(
+                servers.c.id == bindparam("server_id")
+            ).values(
+                is_healthy=bindparam("healthy")
+            ),
+            [{"server_id": server_id, "healthy": healthy} for server_id, healthy in health.items()]
+        )
+        await self.db.commit()
@@ -1,30 +1,137 @@
-from sqlalchemy.orm import Session
-from app.database.models.models import User
+from sqlalchemy import exists, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.models.models import Server, User, UserServer
+from app.database.repositories.outbox_repo import OutboxRepository
+from app.database.repositories.reminder_repo import ReminderRepository
+from app.database.cache import UserCache, user_cache
 from datetime import datetime
+from dateutil.relativedelta import relativedelta
 import uuid
 
 class UserRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
 
-    def get_user(self, telegram_id: int):
-        return self.db.query(User).filter(User.telegram_id == telegram_id).first()
+    def _memo(self) -> dict:
+        # Кэш на время апдейта: сессия живёт ровно один апдейт (DbSessionMiddleware)
+        return self.db.info.setdefault("users_by_telegram_id", {})
+
+    async def get_user(self, telegram_id: int, fresh: bool = False):
+        """fresh=True — строка из БД под FOR UPDATE до конца транзакции, мимо кэша: для чтения-изменения-записи"""
+        memo = self._memo()
+        if fresh:
+            result = await self.db.execute(
+                select(User).where(
+                    User.telegram_id == telegram_id
+                ).with_for_update().execution_options(populate_existing=True)
+            )
+            user = result.scalars().first()
+            memo[telegram_id] = user
+            return user
+        if telegram_id in memo:
+            return memo[telegram_id]
+
+        snapshot = user_cache.get(telegram_id)
+        if snapshot is not None:
+            user = await self.db.merge(UserCache.restore(snapshot), load=False)
+        else:
+            generation = user_cache.generation
+            result = await self.db.execute(select(User).where(User.telegram_id == telegram_id))
+            user = result.scalars().first()
+            if user:
+                user_cache.put(user, generation)
+        memo[telegram_id] = user
+        return user
     
-    def add_user(self, telegram_id: int, username: str):
+    async def add_user(self, telegram_id: int, username: str):
         new_user = User(
-            id=str(uuid.uuid4()),
+            id=uuid.uuid4(),
             telegram_id=telegram_id,
             username=username
         )
         self.db.add(new_user)
-        self.db.commit()
+        await self.db.commit()
+        self._memo()[telegram_id] = new_user
         return new_user
     
-    def update_subscription(self, telegram_id: int, new_date: datetime):
-        user = self.get_user(telegram_id)
-        if user:
-            user.subscription_end = new_date
-            self.db.commit()
-            return True
-        return False
+    async def update_subscription(self, telegram_id: int, months: int, status: str | None = None):
+        """Продлевает подписку на months от даты в БД; возвращает новую дату или None
+
+        Снимок из кэша может отставать на USER_CACHE_TTL и не видеть продление из другого процесса,
+        поэтому дата читается под блокировкой строки и пишется в той же транзакции."""
+        user = await self.get_user(telegram_id, fresh=True)
+        if not user:
+            await self.db.rollback()
+            return None
+        # Истёкшая подписка продлевается от текущего момента, а не от даты в прошлом
+        now = datetime.utcnow()
+        user.subscription_end = max(user.subscription_end or now, now) + relativedelta(months=months)
+        if status:
+            user.status = status
+        # Синхронизацию с панелями выполнит воркер очереди; запись фиксируется вместе с изменением
+        OutboxRepository(self.db).enqueue(user.id)
+        ReminderRepository(self.db).schedule(user)
+        await self.db.commit()
+        return user.subscription_end
+
+    async def claim_activation(self, user: User) -> bool:
+        """Переводит неактивного пользователя в active условным UPDATE; True только у одного из параллельных вызовов
+
+        Выигравший занимает места и создаёт клиентов, остальные только продлевают дату."""
+        result = await self.db.execute(
+            update(User).where(
+                User.id == user.id,
+                User.status.is_distinct_from('active'),
+                User.status.is_distinct_from('blocked')
+            ).values(
+                status='active'
+            ).returning(User.id)
+        )
+        claimed = result.scalar() is not None
+        await self.db.commit()
+        user_cache.invalidate(user.telegram_id)
+        return claimed
+
+    async def release_activation(self, user: User, status: str | None):
+        """Возвращает прежний статус, если после claim_activation доступ вернуть не удалось"""
+        await self.db.execute(
+            update(User).where(
+                User.id == user.id,
+                User.status == 'active'
+            ).values(
+                status=status
+            )
+        )
+        await self.db.commit()
+        user_cache.invalidate(user.telegram_id)
+
+    async def set_status(self, user: User, status: str):
+        user.status = status
+        OutboxRepository(self.db).enqueue(user.id)
+        ReminderRepository(self.db).schedule(user)
+        await self.db.commit()
+
+    async def get_users_on_server(self, server_id: int):
+        result = await self.db.execute(
+            select(User).join(UserServer, UserServer.user_id == User.id).where(
+                UserServer.server_id == server_id
+            )
+        )
+        return result.scalars().all()
+
+    async def get_active_without_country(self, country: str, limit: int):
+        """Активные пользователи, у которых ещё нет сервера в стране country"""
+        has_country = exists().where(
+            UserServer.user_id == User.id,
+            UserServer.server_id == Server.id,
+            Server.country == country
+        )
+        result = await self.db.execute(
+            select(User).where(
+                User.status == 'active',
+                User.subscription_end > datetime.utcnow(),
+                ~has_country
+            ).order_by(User.subscription_end.desc(), User.id).limit(limit)
+        )
+        return result.scalars().all()
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+import time
+from app.core.config import settings
+
+
+class AuthTokenCache:
+    """Кэш токенов авторизации панелей с TTL и единственным логином на сервер"""
+
+    def __init__(self, ttl: float, snapshot_path: str | None = None):
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        # server_id -> (token, expires_at); время в epoch-секундах, чтобы переживать рестарт
+        self._entries: dict[int, tuple[str, float]] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+
+    def _lock(self, server_id: int) -> asyncio.Lock:
+        lock = self._locks.get(server_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[server_id] = lock
+        return lock
+
+    def peek(self, server_id: int) -> str | None:
+        entry = self._entries.get(server_id)
+        if entry and entry[1] > time.time():
+            return entry[0]
+        return None
+
+    async def get(self, server, login) -> str:
+        """Возвращает живой токен; при промахе выполняет login(server) ровно один раз"""
+        token = self.peek(server.id)
+        if token:
+            return token
+
+        # Конкурентные вызовы ждут один и тот же логин, а не шлют свой
+        async with self._lock(server.id):
+            token = self.peek(server.id)
+            if token:
+                return token
+            token = await login(server)
+            self._entries[server.id] = (token, time.time() + self.ttl)
+            self.save()
+            return token
+
+    def invalidate(self, server_id: int, token: str | None = None):
+        """Сбрасывает токен; если передан token, сбрасывает только его (а не уже обновлённый)"""
+        entry = self._entries.get(server_id)
+        if entry and (token is None or entry[0] == token):
+            del self._entries[server_id]
+            self.save()
+
+    def load(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                data = json.load(f)
+            now = time.time()
+            for server_id, (token, expires_at) in data.items():
+                if expires_at > now:
+                    self._entries[int(server_id)] = (token, expires_at)
+            print(f"Загружено токенов панелей из снапшота: {len(self._entries)}")
+        except Exception as e:
+            print(f"Ошибка чтения снапшота токенов: {e}")
+
+    def save(self):
+        if not self.snapshot_path:
+            return
+        try:
+            tmp_path = f"{self.snapshot_path}.tmp"
+            # Токены дают доступ к панелям, поэтому файл доступен только владельцу
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({str(k): list(v) for k, v in self._entries.items()}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Ошибка записи снапшота токенов: {e}")
+
+
+auth_tokens = AuthTokenCache(settings.PANEL_TOKEN_TTL, settings.PANEL_TOKEN_CACHE_PATH)
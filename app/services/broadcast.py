@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import Counter
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from app.core.config import settings
+from app.database.repositories.broadcast_repo import BroadcastRepository
+from app.services.jobs import JobRunner
+
+
+class TokenBucket:
+    """Общий лимит отправки: rate сообщений в секунду, всплеск до capacity; RetryAfter останавливает всех"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        # Ждущие получают токены по очереди
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        # Telegram ограничивает бота целиком, поэтому после RetryAfter молчат все отправители
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+def throughput(broadcast) -> float:
+    """Средняя скорость рассылки, сообщений в секунду"""
+    if not broadcast.started_at:
+        return 0.0
+    elapsed = (broadcast.updated_at - broadcast.started_at).total_seconds()
+    processed = broadcast.sent + broadcast.blocked + broadcast.failed
+    return processed / elapsed if elapsed > 0 else 0.0
+
+
+class BroadcastRunner(JobRunner):
+    """Выполняет рассылки из таблицы broadcasts пачками получателей с общим лимитом скорости"""
+    repository = BroadcastRepository
+    name = "рассылки"
+
+    def __init__(self, rate: float, burst: int, batch_size: int, concurrency: int, max_retries: int,
+                 lease: float, poll_interval: float):
+        super().__init__(lease, poll_interval)
+        self.bucket = TokenBucket(rate, burst)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    async def send(self, bot, chat_id: int, text: str, reply_markup=None) -> tuple[str, str | None]:
+        """Отправляет одно сообщение; возвращает исход (sent, blocked, failed) и текст ошибки"""
+        error = None
+        for _ in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                await bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=reply_markup)
+                return "sent", None
+            except TelegramRetryAfter as e:
+                print(f"Рассылка: Telegram просит подождать {e.retry_after} с")
+                self.bucket.pause(e.retry_after)
+                error = str(e)
+            except TelegramForbiddenError:
+                return "blocked", None
+            except TelegramBadRequest as e:
+                # Чат не найден, неверная разметка и т.п. — повтор не поможет
+                return "failed", str(e)
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                await asyncio.sleep(1)
+        return "failed", error
+
+    async def send_batch(self, bot, recipients, text: str) -> tuple[Counter, str | None]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(chat_id):
+            async with semaphore:
+                return await self.send(bot, chat_id, text)
+
+        results = await asyncio.gather(*(run(telegram_id) for _, telegram_id in recipients))
+        counts = Counter(outcome for outcome, _ in results)
+        errors = [error for outcome, error in results if outcome == "failed" and error]
+        return counts, errors[-1] if errors else None
+
+    def describe(self, broadcast) -> str:
+        return f"Запущена рассылка {broadcast.id}: {broadcast.total} получателей ({broadcast.audience})"
+
+    async def step(self, db, current, context) -> bool:
+        bot, = context
+        repo = BroadcastRepository(db)
+        recipients = await repo.next_recipients(current, self.batch_size)
+        # Соединение с БД не держим, пока идёт отправка
+        await db.commit()
+        if not recipients:
+            await repo.set_status(current.id, 'done', current.last_error)
+            print(f"Рассылка {current.id} завершена: {throughput(current):.1f} сообщений/с")
+            return False
+
+        started = time.monotonic()
+        counts, error = await self.send_batch(bot, recipients, current.text)
+        processed = current.sent + current.blocked + current.failed + len(recipients)
+        await repo.checkpoint(
+            current, recipients[-1][0], counts["sent"], counts["blocked"], counts["failed"], self.lease, error
+        )
+        elapsed = max(time.monotonic() - started, 0.001)
+        print(
+            f"Рассылка {current.id}: {processed}/{current.total}, "
+            f"пачка {len(recipients)} за {elapsed:.1f} с ({len(recipients) / elapsed:.1f} сообщений/с)"
+        )
+        return True
+
+
+broadcaster = BroadcastRunner(
+    settings.BROADCAST_RATE,
+    settings.BROADCAST_BURST,
+    settings.BROADCAST_BATCH_SIZE,
+    settings.BROADCAST_CONCURRENCY,
+    settings.BROADCAST_MAX_RETRIES,
+    settings.BROADCAST_LEASE,
+    settings.BROADCAST_POLL_INTERVAL,
+)
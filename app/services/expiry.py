@@ -0,0 +1,116 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import literal, select, tuple_, update
+from app.database.cache import user_cache
+from app.database.models.models import Server, User, UserServer
+from app.database.repositories.outbox_repo import OutboxRepository
+from app.database.repositories.server_repo import ServerRepository
+from app.services.fanout import fan_out
+from app.services.placement import placement
+from app.services.panels.registry import get_driver
+from app.web.subscription import subscription_documents
+
+
+class ExpirySweeper:
+    """Отключает пользователей с истёкшей подпиской пачками, без запроса на каждого"""
+
+    def __init__(self, batch_size: int, panel_concurrency: int, push_timeout: float):
+        self.batch_size = batch_size
+        self.panel_concurrency = panel_concurrency
+        self.push_timeout = push_timeout
+
+    async def sweep(self, db) -> int:
+        now = datetime.utcnow()
+        cursor = None
+        total = 0
+        while True:
+            # Keyset-пагинация по индексу (status, subscription_end)
+            query = select(User.id, User.subscription_end).where(
+                User.status == 'active',
+                User.subscription_end < now
+            )
+            if cursor:
+                last_end, last_id = cursor
+                query = query.where(tuple_(User.subscription_end, User.id) > tuple_(
+                    literal(last_end, User.subscription_end.type), literal(last_id, User.id.type)
+                ))
+            rows = (await db.execute(
+                query.order_by(User.subscription_end, User.id).limit(self.batch_size)
+            )).all()
+            if not rows:
+                return total
+            cursor = (rows[-1].subscription_end, rows[-1].id)
+
+            # Повторная проверка условия защищает от продления, сделанного между SELECT и UPDATE
+            result = await db.execute(
+                update(User).where(
+                    User.id.in_([row.id for row in rows]),
+                    User.status == 'active',
+                    User.subscription_end < now
+                ).values(status='expired').returning(User)
+            )
+            expired = result.scalars().all()
+            # Отключение на панелях ниже — быстрый путь; записи очереди фиксируются вместе со статусом,
+            # и воркер повторит отключение там, где панель не ответила. Воркер берёт их только после push_timeout
+            entries = await OutboxRepository(db).enqueue_many([user.id for user in expired], delay=self.push_timeout)
+            await db.commit()
+            if expired:
+                total += len(expired)
+                for user in expired:
+                    # Массовый UPDATE идёт мимо ORM-событий, поэтому кэши сбрасываем явно
+                    user_cache.invalidate(user.telegram_id)
+                    subscription_documents.invalidate(user.id)
+                await self.push(db, expired, entries)
+
+    async def push(self, db, users, entries: dict):
+        """Отключает пользователей на панелях, группируя их по серверам; удаляет записи очереди отключённых везде"""
+        users_by_id = {user.id: user for user in users}
+        assignments = await db.execute(
+            select(UserServer.server_id, UserServer.user_id).where(UserServer.user_id.in_(users_by_id))
+        )
+        by_server = defaultdict(list)
+        for server_id, user_id in assignments.all():
+            by_server[server_id].append(users_by_id[user_id])
+        if not by_server:
+            await OutboxRepository(db).delete(list(entries.values()))
+            await db.commit()
+            return
+
+        servers = (await db.execute(select(Server).where(Server.id.in_(by_server)))).scalars().all()
+        # Соединение с БД не держим, пока идут запросы к панелям (до push_timeout)
+        await db.commit()
+
+        async def disable_on_server(server):
+            # Пакетный путь драйвера панели; ограничение параллельности — внутри драйвера
+            server_users = by_server[server.id]
+            results = await get_driver(server).disable_many(server, server_users, self.panel_concurrency)
+            return [user.id for user, result in zip(server_users, results) if result is not None]
+
+        results = await fan_out(servers, disable_on_server, timeout=self.push_timeout)
+        failed = set()
+        for result in results:
+            if not result.ok:
+                failed.update(user.id for user in by_server[result.server_id])
+                print(f"Ошибка отключения истёкших пользователей на сервере {result.server_id}: {result.error}")
+            elif result.value:
+                failed.update(result.value)
+                print(f"Сервер {result.server_id}: не удалось отключить {len(result.value)} пользователей, повторит очередь")
+        await OutboxRepository(db).delete([entry_id for user_id, entry_id in entries.items() if user_id not in failed])
+
+        # Освобождаем места пачкой: одна строка UPDATE на сервер
+        released = {server_id: len(server_users) for server_id, server_users in by_server.items()}
+        await ServerRepository(db).release_counts(released)
+        for server_id, count in released.items():
+            placement.apply(server_id, -count)
+
+    async def run_loop(self, session_pool, interval: float):
+        while True:
+            try:
+                async with session_pool() as db:
+                    expired = await self.sweep(db)
+                if expired:
+                    print(f"Отключено пользователей с истёкшей подпиской: {expired}")
+            except Exception as e:
+                print(f"Ошибка обработки истёкших подписок: {e}")
+            await asyncio.sleep(interval)
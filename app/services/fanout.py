@@ -0,0 +1,33 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any
+from app.core.config import settings
+
+
+@dataclass
+class ServerResult:
+    """Результат операции на одном сервере"""
+    server_id: int
+    ok: bool
+    elapsed: float
+    error: str | None = None
+    value: Any = None
+
+
+async def fan_out(servers, operation, timeout: float | None = None) -> list[ServerResult]:
+    """Выполняет operation(server) на всех серверах параллельно с общим дедлайном"""
+    timeout = timeout if timeout is not None else settings.PANEL_FANOUT_TIMEOUT
+
+    async def run(server) -> ServerResult:
+        started = time.monotonic()
+        try:
+            value = await asyncio.wait_for(operation(server), timeout)
+            return ServerResult(server.id, True, time.monotonic() - started, value=value)
+        except asyncio.TimeoutError:
+            error = f"timeout after {timeout}s"
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+        return ServerResult(server.id, False, time.monotonic() - started, error=error)
+
+    return list(await asyncio.gather(*(run(server) for server in servers)))
@@ -0,0 +1,96 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from sqlalchemy import select
+from app.core.config import settings
+from app.database.models.models import Server
+from app.database.repositories.server_repo import ServerRepository
+from app.services.fanout import fan_out
+from app.services.panels.registry import get_driver
+from app.services.placement import placement
+
+
+@dataclass
+class ServerHealth:
+    """Статистика проверок одного сервера"""
+    healthy: bool = True
+    latency: float | None = None  # Сглаженная задержка успешных проверок, секунды
+    consecutive_failures: int = 0
+    consecutive_successes: int = 0
+    last_error: str | None = None
+    results: deque = field(default_factory=deque)  # Последние проверки: True — успех
+
+    @property
+    def error_rate(self) -> float:
+        return sum(1 for ok in self.results if not ok) / len(self.results) if self.results else 0.0
+
+
+class HealthProber:
+    """Параллельно проверяет все панели и помечает недоступные, чтобы выбор сервера их обходил"""
+
+    def __init__(self, timeout: float, failure_threshold: int, recovery_threshold: int, window: int):
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_threshold = recovery_threshold
+        self.window = window
+        self.servers: dict[int, ServerHealth] = {}
+
+    def record(self, server_id: int, ok: bool, elapsed: float, error: str | None, stored: bool) -> bool | None:
+        """Учитывает результат проверки; возвращает новое состояние, если оно изменилось"""
+        health = self.servers.get(server_id)
+        if health is None:
+            health = self.servers[server_id] = ServerHealth(healthy=stored, results=deque(maxlen=self.window))
+        health.results.append(ok)
+        if ok:
+            health.consecutive_successes += 1
+            health.consecutive_failures = 0
+            health.latency = elapsed if health.latency is None else 0.8 * health.latency + 0.2 * elapsed
+        else:
+            health.consecutive_failures += 1
+            health.consecutive_successes = 0
+            health.last_error = error
+
+        # Гистерезис: одна неудачная проверка не выключает сервер, одна удачная не возвращает
+        if health.healthy and health.consecutive_failures >= self.failure_threshold:
+            health.healthy = False
+        elif not health.healthy and health.consecutive_successes >= self.recovery_threshold:
+            health.healthy = True
+        return health.healthy if health.healthy != stored else None
+
+    async def run_once(self, db) -> dict[int, bool]:
+        servers = (await db.execute(select(Server))).scalars().all()
+        # Соединение с БД не держим, пока идут проверки
+        await db.commit()
+
+        results = await fan_out(servers, lambda server: get_driver(server).probe(server), timeout=self.timeout)
+        stored = {server.id: server.is_healthy for server in servers}
+        changed = {}
+        for result in results:
+            healthy = self.record(result.server_id, result.ok, result.elapsed, result.error, stored[result.server_id])
+            if healthy is not None:
+                changed[result.server_id] = healthy
+
+        if changed:
+            await ServerRepository(db).set_health(changed)
+            for server_id, healthy in changed.items():
+                placement.set_healthy(server_id, healthy)
+                state = "доступен" if healthy else f"недоступен ({self.servers[server_id].last_error})"
+                print(f"Сервер {server_id} {state}")
+        return changed
+
+    async def run_loop(self, session_pool, interval: float):
+        while True:
+            try:
+                async with session_pool() as db:
+                    await self.run_once(db)
+            except Exception as e:
+                print(f"Ошибка проверки доступности серверов: {e}")
+            await asyncio.sleep(interval)
+
+
+health_prober = HealthProber(
+    settings.HEALTH_PROBE_TIMEOUT,
+    settings.HEALTH_FAILURE_THRESHOLD,
+    settings.HEALTH_RECOVERY_THRESHOLD,
+    settings.HEALTH_WINDOW,
+)
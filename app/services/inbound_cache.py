@@ -0,0 +1,59 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class InboundMeta:
+    """Параметры reality входящего подключения, нужные для ссылки vless"""
+    public_key: str
+    server_name: str
+    short_id: str
+
+
+class InboundCache:
+    """Кэш параметров входящих подключений панелей с TTL и одной загрузкой на сервер"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # server_id -> (meta, expires_at)
+        self._entries: dict[int, tuple[InboundMeta, float]] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+
+    def _lock(self, server_id: int) -> asyncio.Lock:
+        lock = self._locks.get(server_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[server_id] = lock
+        return lock
+
+    def peek(self, server_id: int) -> InboundMeta | None:
+        entry = self._entries.get(server_id)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    async def get(self, server, fetch) -> InboundMeta:
+        """Возвращает параметры из кэша; при промахе выполняет fetch(server) ровно один раз"""
+        meta = self.peek(server.id)
+        if meta:
+            return meta
+
+        async with self._lock(server.id):
+            meta = self.peek(server.id)
+            if meta:
+                return meta
+            meta = await fetch(server)
+            self._entries[server.id] = (meta, time.monotonic() + self.ttl)
+            return meta
+
+    def invalidate(self, server_id: int | None = None):
+        """Сбрасывает кэш сервера (например, после смены ключей reality) или всех серверов"""
+        if server_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(server_id, None)
+
+
+inbounds = InboundCache(settings.INBOUND_CACHE_TTL)
@@ -0,0 +1,63 @@
+import asyncio
+
+
+class JobRunner:
+    """Общий цикл очередей задач: аренда, выполнение шагами с проверкой статуса, пауза при ошибке
+
+    Подкласс задаёт repository (наследник JobRepository), name в родительном падеже для логов и step."""
+    repository = None
+    name = "задачи"
+
+    def __init__(self, lease: float, poll_interval: float):
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def describe(self, job) -> str:
+        return f"Запущена задача {job.id}"
+
+    async def start(self, db, job, *args):
+        """Подготовка перед первым шагом; None — задача не запускается (статус выставляет сам start)"""
+        return args
+
+    async def step(self, db, job, context) -> bool:
+        """Один шаг задачи; возвращает False, когда задача закончена или остановлена"""
+        raise NotImplementedError
+
+    async def run_job(self, db, job, *args):
+        repo = self.repository(db)
+        try:
+            context = await self.start(db, job, *args)
+            if context is None:
+                return
+            while True:
+                # Отмена или пауза из админки применяются между шагами
+                current = await repo.get(job.id)
+                if current is None or current.status != 'running':
+                    return
+                if not await self.step(db, current, context):
+                    return
+        except Exception as e:
+            await db.rollback()
+            print(f"Ошибка {self.name} {job.id}: {e}")
+            await repo.set_status(job.id, 'paused', str(e) or e.__class__.__name__)
+
+    async def run_loop(self, session_pool, *args):
+        while True:
+            try:
+                async with session_pool() as db:
+                    job = await self.repository(db).claim(self.lease)
+                    if job:
+                        print(self.describe(job))
+                        await self.run_job(db, job, *args)
+                        continue
+            except Exception as e:
+                print(f"Ошибка взятия {self.name} в работу: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+from app.core.config import settings
+
+DASHBOARD_IMAGE = "app/images/TG_message_LC.png"
+
+
+class MediaRegistry:
+    """Загружает статичные картинки в Telegram один раз и дальше отправляет их по file_id"""
+
+    def __init__(self, cache_path: str | None):
+        self.cache_path = cache_path
+        # "bot_id:path" -> {"hash": sha256 файла, "file_id": id в Telegram}
+        self._entries: dict[str, dict] = {}
+        # path -> ((mtime, size), sha256), чтобы не перечитывать файл на каждый запрос
+        self._hashes: dict[str, tuple[tuple, str]] = {}
+        self._loaded = False
+
+    def _file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._hashes[path] = (signature, digest)
+        return digest
+
+    def get(self, bot_id: int, path: str):
+        """file_id, если файл уже загружен и не менялся, иначе файл для загрузки"""
+        self.load()
+        entry = self._entries.get(f"{bot_id}:{path}")
+        if entry and entry["hash"] == self._file_hash(path):
+            return entry["file_id"]
+        return FSInputFile(path)
+
+    def remember(self, bot_id: int, path: str, message: Message):
+        if not message.photo:
+            return
+        file_id = message.photo[-1].file_id
+        key = f"{bot_id}:{path}"
+        digest = self._file_hash(path)
+        entry = self._entries.get(key)
+        if entry and entry["file_id"] == file_id and entry["hash"] == digest:
+            return
+        self._entries[key] = {"hash": digest, "file_id": file_id}
+        self.save()
+
+    def invalidate(self, bot_id: int, path: str):
+        if self._entries.pop(f"{bot_id}:{path}", None):
+            self.save()
+
+    async def answer_photo(self, message: Message, path: str, **kwargs) -> Message:
+        """Отправляет картинку ответом на сообщение, переиспользуя file_id"""
+        bot_id = message.bot.id
+        photo = self.get(bot_id, path)
+        try:
+            sent = await message.answer_photo(photo=photo, **kwargs)
+        except TelegramBadRequest:
+            if isinstance(photo, FSInputFile):
+                raise
+            # file_id мог стать недействительным — загружаем файл заново
+            self.invalidate(bot_id, path)
+            sent = await message.answer_photo(photo=FSInputFile(path), **kwargs)
+        self.remember(bot_id, path, sent)
+        return sent
+
+    def load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            print(f"Ошибка чтения кэша file_id: {e}")
+
+    def save(self):
+        if not self.cache_path:
+            return
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"Ошибка записи кэша file_id: {e}")
+
+
+media = MediaRegistry(settings.MEDIA_CACHE_PATH)
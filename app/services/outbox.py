@@ -0,0 +1,111 @@
+import asyncio
+from collections import defaultdict
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.database.models.models import Server, User, UserServer
+from app.database.repositories.outbox_repo import OutboxRepository
+from app.services.fanout import fan_out
+from app.services.vpn import VPNService
+from app.web.subscription import subscription_documents
+
+
+class OutboxWorker:
+    """Разбирает panel_outbox: одна синхронизация с панелями на пользователя, сколько бы записей ни накопилось"""
+
+    def __init__(self, batch_size: int, poll_interval: float, base_backoff: float, max_backoff: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def backoff(self, attempts: int) -> float:
+        return min(self.base_backoff * 2 ** attempts, self.max_backoff)
+
+    async def sync_user(self, user, servers) -> str | None:
+        """Синхронизирует пользователя на всех его серверах; возвращает текст ошибки или None"""
+        if user is None or not servers:
+            return None
+        results = await fan_out(servers, lambda server: VPNService.update_client(server, user))
+        failed = [result for result in results if not result.ok]
+        if failed:
+            return "; ".join(f"server {result.server_id}: {result.error}" for result in failed)
+        return None
+
+    async def drain_once(self, db) -> int:
+        outbox = OutboxRepository(db)
+        entries = await outbox.fetch_due(self.batch_size)
+        if not entries:
+            await db.commit()
+            return 0
+
+        # Несколько изменений одного пользователя схлопываются в один вызов панели
+        by_user = defaultdict(list)
+        for entry in entries:
+            by_user[entry.user_id].append(entry)
+
+        users = {
+            user.id: user
+            for user in (await db.execute(select(User).where(User.id.in_(by_user)))).scalars()
+        }
+        servers_by_user = defaultdict(list)
+        assignments = await db.execute(
+            select(UserServer.user_id, Server).join(Server, Server.id == UserServer.server_id).where(
+                UserServer.user_id.in_(by_user)
+            )
+        )
+        for user_id, server in assignments.all():
+            servers_by_user[user_id].append(server)
+
+        errors = await asyncio.gather(*(
+            self.sync_user(users.get(user_id), servers_by_user.get(user_id)) for user_id in by_user
+        ))
+
+        for user_id, error in zip(by_user, errors):
+            # Документ подписки строится из БД, поэтому устаревает вместе с изменением, даже если панель не ответила
+            subscription_documents.invalidate(user_id)
+            ids = [entry.id for entry in by_user[user_id]]
+            if error is None:
+                await outbox.delete(ids)
+            else:
+                attempts = max(entry.attempts for entry in by_user[user_id])
+                print(f"Ошибка синхронизации пользователя {user_id} (попытка {attempts + 1}): {error}")
+                await outbox.reschedule(ids, self.backoff(attempts), error)
+        await db.commit()
+        return len(by_user)
+
+    async def run_loop(self, session_pool):
+        while True:
+            try:
+                async with session_pool() as db:
+                    processed = await self.drain_once(db)
+            except Exception as e:
+                print(f"Ошибка обработки очереди синхронизации: {e}")
+                processed = 0
+            if processed:
+                # В очереди могут остаться готовые записи — берём следующую пачку сразу
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+outbox_worker = OutboxWorker(
+    settings.OUTBOX_BATCH_SIZE,
+    settings.OUTBOX_POLL_INTERVAL,
+    settings.OUTBOX_BASE_BACKOFF,
+    settings.OUTBOX_MAX_BACKOFF,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_outbox_worker(session):
+    # Воркер этого процесса забирает запись сразу после фиксации, не дожидаясь опроса
+    if session.info.pop("outbox_pending", False):
+        outbox_worker.wake()
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import time
+import aiohttp
+from dataclasses import dataclass, field
+from multidict import CIMultiDict
+from app.core.config import settings
+from app.services.resilience import AdaptiveLimiter, CircuitBreaker
+
+
+@dataclass
+class PanelResponse:
+    """Прочитанный ответ панели (соединение уже возвращено в пул)"""
+    status: int
+    text: str
+    url: str
+    headers: CIMultiDict = field(default_factory=CIMultiDict)
+    cookies: dict = field(default_factory=dict)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+# Перегрузка панели: лимит параллельных запросов уменьшается, автомат не трогаем
+OVERLOAD_STATUSES = {429, 503}
+
+
+class PanelClient:
+    """Асинхронный клиент панели с пулом keep-alive соединений, автоматом и адаптивным лимитом для одного сервера"""
+
+    def __init__(self, server_id: int):
+        self.server_id = server_id
+        self._session: aiohttp.ClientSession | None = None
+        self.breaker = CircuitBreaker(server_id, settings.PANEL_BREAKER_THRESHOLD, settings.PANEL_BREAKER_RESET)
+        self.limiter = AdaptiveLimiter(
+            settings.PANEL_POOL_LIMIT,
+            settings.PANEL_CONCURRENCY_MIN,
+            settings.PANEL_POOL_LIMIT,
+            settings.PANEL_QUEUE_LIMIT,
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Сессия создаётся лениво, уже внутри запущенного event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                ssl=False,
+                limit=settings.PANEL_POOL_LIMIT,
+                keepalive_timeout=settings.PANEL_KEEPALIVE,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=settings.PANEL_TIMEOUT, connect=settings.PANEL_CONNECT_TIMEOUT),
+                cookie_jar=aiohttp.DummyCookieJar(),
+            )
+        return self._session
+
+    async def request(self, method: str, url: str, deadline: float | None = None, **kwargs) -> PanelResponse:
+        """Запрос с дедлайном на всё время, включая ожидание в очереди к панели"""
+        deadline = settings.PANEL_TIMEOUT if deadline is None else deadline
+        started = time.monotonic()
+        self.breaker.before_call()
+        try:
+            await self.limiter.acquire(deadline)
+        except BaseException:
+            self.breaker.abandon()
+            raise
+
+        settled = False
+        try:
+            remaining = max(deadline - (time.monotonic() - started), 0.1)
+            timeout = aiohttp.ClientTimeout(total=remaining, connect=min(remaining, settings.PANEL_CONNECT_TIMEOUT))
+            try:
+                response = await self._send(method, url, timeout=timeout, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                self.breaker.record_failure()
+                self.limiter.on_overload()
+                settled = True
+                raise
+
+            if response.status in OVERLOAD_STATUSES:
+                self.limiter.on_overload()
+            else:
+                self.limiter.on_success()
+            if response.status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            settled = True
+            return response
+        finally:
+            if not settled:
+                self.breaker.abandon()
+            self.limiter.release()
+
+    async def _send(self, method: str, url: str, **kwargs) -> PanelResponse:
+        async with self.session.request(method, url, **kwargs) as response:
+            text = await response.text()
+            return PanelResponse(
+                status=response.status,
+                text=text,
+                url=str(response.url),
+                headers=response.headers.copy(),
+                cookies={name: morsel.value for name, morsel in response.cookies.items()},
+            )
+
+    async def get(self, url: str, **kwargs) -> PanelResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> PanelResponse:
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> PanelResponse:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class PanelClientPool:
+    """Реестр клиентов: один пул соединений на строку Server, общий для всех хендлеров"""
+
+    def __init__(self):
+        self._clients: dict[int, PanelClient] = {}
+
+    def get(self, server) -> PanelClient:
+        client = self._clients.get(server.id)
+        if client is None:
+            client = PanelClient(server.id)
+            self._clients[server.id] = client
+        return client
+
+    def peek(self, server_id: int) -> PanelClient | None:
+        return self._clients.get(server_id)
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.close()
+        self._clients.clear()
+
+
+panel_clients = PanelClientPool()
@@ -0,0 +1,72 @@
+import asyncio
+from dataclasses import dataclass
+
+
+class PanelRejectedError(Exception):
+    """Панель ответила, но отклонила сами данные запроса (например, 3x-ui: 200 и success: false)"""
+
+
+@dataclass
+class PanelStats:
+    """Сводка с панели одного сервера"""
+    clients: int
+
+
+class PanelDriver:
+    """Все обращения к API панели одного типа; выбирается по Server.panel_type"""
+    name = ""
+
+    async def provision(self, server, user_data: dict):
+        """Создаёт клиента; user_data: id, username, tgId, subscription_end (YYYY-MM-DD или None), enable (по умолчанию True)"""
+        raise NotImplementedError
+
+    async def update(self, server, user, enable: bool | None = None):
+        """Приводит клиента на панели к состоянию пользователя в БД; enable переопределяет статус"""
+        raise NotImplementedError
+
+    async def remove(self, server, user_id):
+        """Удаляет клиента с панели; отсутствие клиента считается успехом"""
+        raise NotImplementedError
+
+    async def disable(self, server, user):
+        await self.update(server, user, enable=False)
+
+    async def probe(self, server):
+        """Лёгкий запрос для проверки доступности панели; при недоступности бросает исключение"""
+        raise NotImplementedError
+
+    async def fetch_stats(self, server) -> PanelStats:
+        raise NotImplementedError
+
+    async def fetch_client_ids(self, server) -> set[str]:
+        """UUID всех клиентов, которые уже есть на панели"""
+        raise NotImplementedError
+
+    async def connection_url(self, server, user_id, remark: str = "RONIX-VPN") -> str:
+        raise NotImplementedError
+
+    # Пакетные варианты возвращают по элементу на пользователя: None или исключение.
+    # По умолчанию — параллельные одиночные вызовы; драйвер переопределяет их, если панель умеет пачки.
+
+    async def provision_many(self, server, users_data: list[dict], concurrency: int = 10) -> list[Exception | None]:
+        return await self.run_each(users_data, lambda user_data: self.provision(server, user_data), concurrency)
+
+    async def update_many(self, server, users, concurrency: int = 10, enable: bool | None = None) -> list[Exception | None]:
+        return await self.run_each(users, lambda user: self.update(server, user, enable), concurrency)
+
+    async def disable_many(self, server, users, concurrency: int = 10) -> list[Exception | None]:
+        return await self.update_many(server, users, concurrency, enable=False)
+
+    async def remove_many(self, server, user_ids, concurrency: int = 10) -> list[Exception | None]:
+        return await self.run_each(user_ids, lambda user_id: self.remove(server, user_id), concurrency)
+
+    @staticmethod
+    async def run_each(items, operation, concurrency: int) -> list[Exception | None]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(item):
+            async with semaphore:
+                await operation(item)
+
+        results = await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+        return [result if isinstance(result, Exception) else None for result in results]
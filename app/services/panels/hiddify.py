@@ -0,0 +1,97 @@
+from datetime import datetime
+from urllib.parse import quote_plus
+from app.services.panel_client import panel_clients
+from app.services.panels.base import PanelDriver, PanelStats
+
+
+class HiddifyDriver(PanelDriver):
+    """Панель Hiddify: API v2 с ключом администратора в заголовке Hiddify-API-Key"""
+    name = "hiddify"
+
+    @staticmethod
+    def base_url(server) -> str:
+        return f"{server.server_address}/{server.server_sub}/api/v2/admin"
+
+    async def request(self, server, method, path, **kwargs):
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Hiddify-API-Key": server.api,
+            **kwargs.pop("headers", {})
+        }
+        return await panel_clients.get(server).request(method, f"{self.base_url(server)}{path}", headers=headers, **kwargs)
+
+    async def provision(self, server, user_data):
+        subscription_end = user_data.get("subscription_end")
+        package_days = (
+            (datetime.strptime(subscription_end, "%Y-%m-%d").date() - datetime.now().date()).days if subscription_end else 0
+        )
+        enabled = user_data.get("enable", True)
+
+        payload = {
+            "name": user_data.get("username"),
+            "telegram_id": user_data.get("tgId"),
+            "usage_limit_GB": 200,
+            "package_days": package_days,
+            "start_date": datetime.now().date().isoformat(),
+            "uuid": str(user_data.get("id")),
+            "enable": enabled,
+            "is_active": enabled,
+            "mode": "monthly",
+            "lang": "ru",
+        }
+
+        response = await self.request(server, "POST", "/user/", json=payload)
+        if response.status != 200:
+            raise Exception(f"{response.status} - {response.text}")
+        print(f"Пользователь успешно добавлен в Hiddify на сервер {server.id}.")
+
+    async def update(self, server, user, enable=None):
+        package_days = (user.subscription_end.date() - datetime.now().date()).days if user.subscription_end else 0
+        enabled = user.status == "active" if enable is None else enable
+
+        payload = {
+            "name": user.username,
+            "telegram_id": user.telegram_id,
+            "usage_limit_GB": 200,
+            "package_days": package_days,
+            "start_date": datetime.now().date().isoformat(),
+            "mode": "monthly",
+            "lang": "ru",
+            "enable": enabled,
+            "is_active": enabled,
+            "uuid": str(user.id),
+            "current_usage_GB": 0,
+            "last_reset_time": None
+        }
+
+        response = await self.request(server, "PATCH", f"/user/{user.id}/", json=payload)
+        if response.status not in (200, 204):
+            raise Exception(f"Ошибка обновления: {response.status} - {response.text}")
+
+    async def remove(self, server, user_id):
+        response = await self.request(server, "DELETE", f"/user/{user_id}/")
+        if response.status not in (200, 204, 404):
+            raise Exception(f"{response.status} - {response.text}")
+
+    async def probe(self, server):
+        # Проверка доступности и ключа API (бывший check_server_connection)
+        response = await self.request(server, "GET", "/system/")
+        if response.status != 200:
+            raise Exception(f"{response.status} - {response.text[:200]}")
+
+    async def fetch_users(self, server) -> list[dict]:
+        response = await self.request(server, "GET", "/user/")
+        if response.status != 200:
+            raise Exception(f"Error while fetching data: {response.status}")
+        return response.json()
+
+    async def fetch_stats(self, server):
+        return PanelStats(clients=len(await self.fetch_users(server)))
+
+    async def fetch_client_ids(self, server):
+        return {user["uuid"] for user in await self.fetch_users(server)}
+
+    async def connection_url(self, server, user_id, remark="RONIX-VPN"):
+        # Ссылка на страницу пользователя Hiddify строится без запроса к панели
+        return f"{server.server_address}/{server.user_api}/{user_id}/#{quote_plus(remark)}"
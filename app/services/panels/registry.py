@@ -0,0 +1,23 @@
+from app.core.config import settings
+from app.services.panels.base import PanelDriver
+from app.services.panels.hiddify import HiddifyDriver
+from app.services.panels.xui import XUIDriver
+
+DRIVERS: dict[str, PanelDriver] = {driver.name: driver for driver in (XUIDriver(), HiddifyDriver())}
+
+# Короткие значения VPN_TYPE из старых .env
+ALIASES = {"x": "3x-ui", "3x": "3x-ui", "h": "hiddify"}
+
+
+def resolve_panel_type(panel_type: str | None) -> str:
+    panel_type = (panel_type or settings.VPN_TYPE).strip().lower()
+    return ALIASES.get(panel_type, panel_type)
+
+
+def get_driver(server) -> PanelDriver:
+    """Драйвер по Server.panel_type; для строк без типа — по VPN_TYPE"""
+    panel_type = resolve_panel_type(server.panel_type)
+    driver = DRIVERS.get(panel_type)
+    if driver is None:
+        raise ValueError(f"Неизвестный тип панели {panel_type!r} у сервера {server.id}")
+    return driver
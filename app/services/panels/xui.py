@@ -0,0 +1,181 @@
+import json
+from datetime import datetime
+from urllib.parse import quote_plus
+from app.services.auth_cache import auth_tokens
+from app.services.inbound_cache import InboundMeta, inbounds
+from app.services.panel_client import panel_clients
+from app.services.panels.base import PanelDriver, PanelRejectedError, PanelStats
+
+# Коды, с которыми 3x-ui отвечает на запрос с протухшей сессией
+AUTH_ERROR_STATUSES = (401, 301, 302, 303, 307, 308)
+
+
+class XUIDriver(PanelDriver):
+    """Панель 3x-ui: сессия по cookie, клиенты во входящем подключении с id 1"""
+    name = "3x-ui"
+    inbound_id = 1
+    flow = "xtls-rprx-vision"
+
+    @staticmethod
+    def base_url(server) -> str:
+        return f"{server.server_address}:{server.server_port}/{server.server_sub}"
+
+    async def login(self, server) -> str:
+        """Вход на панель; вызывается только из кэша токенов"""
+        try:
+            login_payload = {
+                "username": server.login,
+                "password": server.password
+            }
+            login_response = await panel_clients.get(server).post(f"{self.base_url(server)}/login", json=login_payload)
+
+            if login_response.status == 200:
+                token = login_response.cookies.get('3x-ui')
+                if not token:
+                    raise ValueError("Авторизация успешна, но токен не получен")
+                return token
+            else:
+                raise Exception(f"Ошибка авторизации: {login_response.status, login_response.text}")
+
+        except Exception as e:
+            print(f"Ошибка при получении токена: {e}")
+            raise
+
+    async def request(self, server, method, path, **kwargs):
+        """Запрос к API панели с кэшированным токеном и повторным входом при истёкшей сессии"""
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            **kwargs.pop("headers", {})
+        }
+        client = panel_clients.get(server)
+        url = f"{self.base_url(server)}{path}"
+
+        token = await auth_tokens.get(server, self.login)
+        headers["Cookie"] = f"3x-ui={token}"
+        response = await client.request(method, url, headers=headers, allow_redirects=False, **kwargs)
+        if response.status not in AUTH_ERROR_STATUSES:
+            return response
+
+        print(f"Сессия на сервере {server.id} истекла, выполняем повторный вход")
+        auth_tokens.invalidate(server.id, token)
+        token = await auth_tokens.get(server, self.login)
+        headers["Cookie"] = f"3x-ui={token}"
+        return await client.request(method, url, headers=headers, allow_redirects=False, **kwargs)
+
+    def client_settings(self, user_id, username, telegram_id, expiry_ms: int, enable: bool) -> dict:
+        return {
+            "id": str(user_id),
+            "flow": self.flow,
+            "email": username,
+            "limitIp": 3,
+            "totalGB": 0,
+            "expiryTime": expiry_ms,
+            "enable": enable,
+            "tgId": telegram_id,
+        }
+
+    def new_client_settings(self, user_data: dict) -> dict:
+        subscription_end = user_data.get("subscription_end")
+        expiry_ms = datetime.strptime(subscription_end, "%Y-%m-%d").timestamp() * 1000 if subscription_end else 0
+        return self.client_settings(
+            user_data.get("id"), user_data.get("username"), user_data.get("tgId"), expiry_ms, user_data.get("enable", True)
+        )
+
+    async def add_clients(self, server, clients: list[dict]):
+        payload = {
+            "id": self.inbound_id,
+            "settings": json.dumps({"clients": clients})
+        }
+        response = await self.request(server, "POST", "/panel/api/inbounds/addClient", json=payload)
+        self.check_response(response, "addClient")
+
+    @staticmethod
+    def check_response(response, action: str):
+        """3x-ui отвечает 200 и на логические ошибки, признак успеха — поле success"""
+        if response.status != 200:
+            raise Exception(f"{response.status} - {response.text}")
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if isinstance(body, dict) and body.get("success") is False:
+            raise PanelRejectedError(body.get("msg") or f"{action} failed")
+
+    async def provision(self, server, user_data):
+        await self.add_clients(server, [self.new_client_settings(user_data)])
+        print(f"Пользователь успешно добавлен на VPN сервер {server.id}.")
+
+    async def provision_many(self, server, users_data, concurrency=10):
+        # addClient принимает список клиентов: вся пачка одним запросом
+        if not users_data:
+            return []
+        try:
+            await self.add_clients(server, [self.new_client_settings(user_data) for user_data in users_data])
+        except Exception as e:
+            return [e] * len(users_data)
+        return [None] * len(users_data)
+
+    async def update(self, server, user, enable=None):
+        settings_data = {
+            "clients": [
+                self.client_settings(
+                    user.id,
+                    user.username,
+                    user.telegram_id,
+                    int(user.subscription_end.timestamp() * 1000) if user.subscription_end else 0,
+                    user.status == "active" if enable is None else enable,
+                )
+            ]
+        }
+        payload = {
+            "id": self.inbound_id,
+            "settings": json.dumps(settings_data)
+        }
+        response = await self.request(server, "POST", f"/panel/api/inbounds/updateClient/{user.id}", json=payload)
+        self.check_response(response, "updateClient")
+
+    async def remove(self, server, user_id):
+        response = await self.request(server, "POST", f"/panel/api/inbounds/{self.inbound_id}/delClient/{user_id}")
+        try:
+            self.check_response(response, "delClient")
+        except PanelRejectedError as e:
+            # «Client Not Found In Inbound»: клиента уже нет — цель удаления достигнута
+            if "not found" not in str(e).lower():
+                raise
+
+    async def probe(self, server):
+        # Статус сервера: небольшой ответ, но проверяет и вход по кэшированному токену
+        response = await self.request(server, "POST", "/server/status")
+        if response.status != 200:
+            raise Exception(f"{response.status} - {response.text[:200]}")
+
+    async def get_inbound(self, server) -> dict:
+        response = await self.request(server, "GET", f"/panel/api/inbounds/get/{self.inbound_id}")
+        if response.status != 200:
+            raise Exception(f"Error while fetching data: {response.status}")
+        return response.json()["obj"]
+
+    async def fetch_inbound(self, server) -> InboundMeta:
+        """Параметры reality входящего подключения; вызывается только из кэша inbounds"""
+        stream_data = json.loads((await self.get_inbound(server))["streamSettings"])["realitySettings"]
+        return InboundMeta(
+            public_key=stream_data["settings"]["publicKey"],
+            server_name=stream_data["serverNames"][0],
+            short_id=stream_data["shortIds"][0],
+        )
+
+    async def fetch_clients(self, server) -> list[dict]:
+        return json.loads((await self.get_inbound(server))["settings"])["clients"]
+
+    async def fetch_stats(self, server):
+        return PanelStats(clients=len(await self.fetch_clients(server)))
+
+    async def fetch_client_ids(self, server):
+        return {client["id"] for client in await self.fetch_clients(server)}
+
+    async def connection_url(self, server, user_id, remark="RONIX-VPN"):
+        # Параметры reality из кэша: в обычном случае ни одного запроса к панели
+        inbound = await inbounds.get(server, self.fetch_inbound)
+        domain = server.server_address.replace("https://", "")
+        return f"vless://{user_id}@{domain}:443?type=tcp&security=reality&pbk={quote_plus(inbound.public_key)}&fp=chrome&sni={quote_plus(inbound.server_name)}&sid={inbound.short_id}&spx=%2F&flow={self.flow}#{quote_plus(remark)}"
@@ -0,0 +1,163 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from sqlalchemy import select
+from app.core.config import settings
+from app.database.models.models import Server
+
+
+@dataclass
+class ServerLoad:
+    """Снимок загрузки одного сервера"""
+    id: int
+    country: str
+    current_users: int
+    max_users: int
+    healthy: bool = True
+
+    @property
+    def free(self) -> int:
+        return max(self.max_users - self.current_users, 0)
+
+    @property
+    def ratio(self) -> float:
+        return self.current_users / self.max_users if self.max_users else 1.0
+
+
+class PlacementPolicy:
+    """Выбор сервера внутри страны"""
+    name = ""
+
+    def choose(self, engine: "PlacementEngine", country: str) -> ServerLoad | None:
+        candidates = engine.candidates(country)
+        return self.select(candidates) if candidates else None
+
+    def select(self, candidates: list[ServerLoad]) -> ServerLoad | None:
+        raise NotImplementedError
+
+
+class LeastLoadedPolicy(PlacementPolicy):
+    """Наименее загруженный сервер; ответ берётся из кэша движка за O(1) на страну"""
+    name = "least_loaded"
+
+    def choose(self, engine, country):
+        return engine.least_loaded(country)
+
+    def select(self, candidates):
+        return min(candidates, key=lambda load: (load.ratio, load.id))
+
+
+class WeightedPolicy(PlacementPolicy):
+    """Случайный сервер с вероятностью, пропорциональной свободным местам"""
+    name = "weighted"
+
+    def select(self, candidates):
+        return random.choices(candidates, weights=[load.free for load in candidates])[0]
+
+
+class FillFirstPolicy(PlacementPolicy):
+    """Заполняет самый загруженный сервер, пока на нём есть места"""
+    name = "fill_first"
+
+    def select(self, candidates):
+        return max(candidates, key=lambda load: (load.ratio, -load.id))
+
+
+POLICIES = {policy.name: policy for policy in (LeastLoadedPolicy, WeightedPolicy, FillFirstPolicy)}
+
+
+class PlacementEngine:
+    """Снимок загрузки серверов в памяти: выбор сервера без запросов к БД"""
+
+    def __init__(self, policy: PlacementPolicy):
+        self.policy = policy
+        self._servers: dict[int, ServerLoad] = {}
+        self._by_country: dict[str, list[int]] = {}
+        # Кэш наименее загруженного сервера по стране, пересчитывается только для изменённой страны
+        self._best: dict[str, int | None] = {}
+        self.refreshed_at: float | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.refreshed_at is not None
+
+    async def refresh(self, db):
+        result = await db.execute(
+            select(Server.id, Server.country, Server.current_users, Server.max_users, Server.is_healthy)
+        )
+        servers = {}
+        by_country = {}
+        for server_id, country, current_users, max_users, healthy in result.all():
+            servers[server_id] = ServerLoad(server_id, country, current_users or 0, max_users, healthy)
+            by_country.setdefault(country, []).append(server_id)
+        self._servers = servers
+        self._by_country = by_country
+        self._best = {}
+        for country in by_country:
+            self._recompute(country)
+        self.refreshed_at = time.monotonic()
+
+    def _recompute(self, country: str):
+        candidates = self.candidates(country)
+        self._best[country] = LeastLoadedPolicy().select(candidates).id if candidates else None
+
+    def candidates(self, country: str) -> list[ServerLoad]:
+        return [
+            load for load in (self._servers[server_id] for server_id in self._by_country.get(country, []))
+            if load.free > 0 and load.healthy
+        ]
+
+    def least_loaded(self, country: str) -> ServerLoad | None:
+        server_id = self._best.get(country)
+        return self._servers[server_id] if server_id is not None else None
+
+    def apply(self, server_id: int, delta: int):
+        """Учитывает резервирование (+1) или освобождение (-1) места"""
+        load = self._servers.get(server_id)
+        if load is None:
+            return
+        load.current_users = min(max(load.current_users + delta, 0), load.max_users)
+        self._recompute(load.country)
+
+    def mark_full(self, server_id: int):
+        """Сервер оказался заполнен (резервирование не удалось) — не предлагаем его до обновления"""
+        load = self._servers.get(server_id)
+        if load is None:
+            return
+        load.current_users = load.max_users
+        self._recompute(load.country)
+
+    def set_healthy(self, server_id: int, healthy: bool):
+        """Результат HealthProber: недоступный сервер не предлагается до восстановления"""
+        load = self._servers.get(server_id)
+        if load is None or load.healthy == healthy:
+            return
+        load.healthy = healthy
+        self._recompute(load.country)
+
+    def pick(self) -> int | None:
+        """Один сервер по политике среди всех стран"""
+        choices = [load for load in (self.policy.choose(self, country) for country in self._by_country) if load]
+        if not choices:
+            return None
+        return self.policy.select(choices).id
+
+    def pick_per_country(self) -> list[int]:
+        """По одному серверу на каждую страну"""
+        return [
+            load.id for load in (self.policy.choose(self, country) for country in self._by_country) if load
+        ]
+
+    async def run_refresh_loop(self, session_pool, interval: float):
+        """Периодически сверяет снимок с БД (изменения других процессов и ручные правки)"""
+        while True:
+            try:
+                async with session_pool() as db:
+                    await self.refresh(db)
+            except Exception as e:
+                print(f"Ошибка обновления снимка загрузки серверов: {e}")
+            await asyncio.sleep(interval)
+
+
+placement = PlacementEngine(POLICIES.get(settings.PLACEMENT_POLICY, LeastLoadedPolicy)())
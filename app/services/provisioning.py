@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+from app.database.repositories.server_repo import ServerRepository
+from app.database.repositories.user_repo import UserRepository
+from app.services.panels.base import PanelRejectedError
+from app.services.panels.registry import get_driver
+from app.services.placement import placement
+from app.web.subscription import subscription_documents
+
+
+@dataclass
+class ProvisionReport:
+    """Итог массового создания клиентов на одном сервере"""
+    server_id: int
+    requested: int = 0
+    created: int = 0
+    existing: int = 0  # уже были на панели
+    requests: int = 0
+    failed: dict = field(default_factory=dict)  # user_id -> текст ошибки
+
+
+def user_data(user) -> dict:
+    """Данные клиента для драйвера панели в том же формате, что при оплате"""
+    return {
+        "id": user.id,
+        "username": user.username,
+        "tgId": user.telegram_id,
+        "subscription_end": user.subscription_end.strftime("%Y-%m-%d") if user.subscription_end else None,
+        "enable": user.status == "active",
+    }
+
+
+class BulkProvisioner:
+    """Создаёт много клиентов на сервере пачками addClient вместо запроса на каждого"""
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+
+    async def provision_chunk(self, driver, server, chunk, report: ProvisionReport) -> list[Exception | None]:
+        results = await driver.provision_many(server, [user_data(user) for user in chunk])
+        report.requests += 1
+        if len(chunk) > 1 and all(isinstance(result, PanelRejectedError) for result in results):
+            # Панель отклонила данные пачки (например, один клиент уже существует) — делим пополам,
+            # чтобы проблемные клиенты не утянули за собой остальных. Недоступную панель, таймаут
+            # или разомкнутый автомат делением не обойти: такая пачка сразу считается неудачной
+            middle = len(chunk) // 2
+            return (
+                await self.provision_chunk(driver, server, chunk[:middle], report)
+                + await self.provision_chunk(driver, server, chunk[middle:], report)
+            )
+        return results
+
+    async def provision(self, server, users) -> ProvisionReport:
+        driver = get_driver(server)
+        report = ProvisionReport(server.id, requested=len(users))
+        for start in range(0, len(users), self.chunk_size):
+            chunk = users[start:start + self.chunk_size]
+            results = await self.provision_chunk(driver, server, chunk, report)
+            for user, result in zip(chunk, results):
+                if result is None:
+                    report.created += 1
+                else:
+                    report.failed[user.id] = str(result) or result.__class__.__name__
+        return report
+
+    async def restore(self, db, server_id: int) -> ProvisionReport | None:
+        """Пересоздаёт на панели всех назначенных серверу пользователей (после переустановки панели)"""
+        server = await ServerRepository(db).get_server_by_id(server_id)
+        if not server:
+            return None
+        users = await UserRepository(db).get_users_on_server(server.id)
+        # Соединение с БД не держим, пока идут запросы к панели
+        await db.commit()
+        # Одним запросом узнаём, кто уже есть на панели, и создаём только недостающих
+        existing = await get_driver(server).fetch_client_ids(server)
+        missing = [user for user in users if str(user.id) not in existing]
+        report = await self.provision(server, missing)
+        report.requests += 1
+        report.requested = len(users)
+        report.existing = len(users) - len(missing)
+        return report
+
+    async def onboard(self, db, server_id: int) -> ProvisionReport | None:
+        """Заполняет новый сервер активными пользователями, у которых нет сервера в его стране"""
+        server_repo = ServerRepository(db)
+        server = await server_repo.get_server_by_id(server_id)
+        if not server:
+            return None
+        free = server.max_users - (server.current_users or 0)
+        users = await UserRepository(db).get_active_without_country(server.country, free) if free > 0 else []
+        if not users or not await server_repo.reserve_count(server.id, len(users)):
+            # Места заняли параллельно — отчёт без изменений, команду можно повторить
+            return ProvisionReport(server.id)
+        placement.apply(server.id, len(users))
+
+        report = await self.provision(server, users)
+        created = [user.id for user in users if user.id not in report.failed]
+        await server_repo.assign_users(server.id, created)
+        for created_id in created:
+            subscription_documents.invalidate(created_id)
+        if report.failed:
+            await server_repo.release_counts({server.id: len(report.failed)})
+            placement.apply(server.id, -len(report.failed))
+        return report
@@ -0,0 +1,184 @@
+import asyncio
+from datetime import datetime
+from app.core.config import settings
+from app.database.repositories.rebalance_repo import RebalanceRepository
+from app.database.repositories.server_repo import ServerRepository
+from app.services.jobs import JobRunner
+from app.services.panels.registry import get_driver
+from app.services.placement import placement
+from app.services.provisioning import BulkProvisioner
+from app.web.subscription import subscription_documents
+
+
+class RebalanceRunner(JobRunner):
+    """Выполняет задачи rebalance_jobs: перенос или копирование пользователей между серверами пачками"""
+    repository = RebalanceRepository
+    name = "задачи переноса"
+
+    def __init__(self, batch_size: int, panel_concurrency: int, chunk_size: int, lease: float, poll_interval: float):
+        super().__init__(lease, poll_interval)
+        self.batch_size = batch_size
+        self.panel_concurrency = panel_concurrency
+        self.provisioner = BulkProvisioner(chunk_size)
+
+    async def provision_target(self, target, users, existing: dict) -> set:
+        """Создаёт недостающих клиентов на целевом сервере; возвращает id тех, кого создать не удалось"""
+        if target.id not in existing:
+            # Один раз за запуск: после рестарта часть пачки уже может быть на панели
+            existing[target.id] = await get_driver(target).fetch_client_ids(target)
+        missing = [user for user in users if str(user.id) not in existing[target.id]]
+        report = await self.provisioner.provision(target, missing)
+        existing[target.id].update(str(user.id) for user in missing if user.id not in report.failed)
+        return set(report.failed)
+
+    async def run_batch(self, db, job, source, targets, existing: dict, state: dict) -> bool:
+        """Одна пачка; возвращает False, когда задача закончена или остановлена"""
+        repo = RebalanceRepository(db)
+        limit = self.batch_size
+        if job.user_limit is not None:
+            limit = min(limit, job.user_limit - job.processed - job.failed)
+        users = await repo.next_batch(job, limit) if limit > 0 else []
+        if not users:
+            await repo.set_status(job.id, 'done', job.last_error)
+            return False
+
+        # Место занимают только активные с непросроченной подпиской — как в CapacityReconciler
+        now = datetime.utcnow()
+        holding = {
+            user.id for user in users
+            if user.status == 'active' and user.subscription_end and user.subscription_end > now
+        }
+
+        for target in targets:
+            await db.refresh(target)
+        free = {target.id: target.max_users - (target.current_users or 0) for target in targets}
+        pairs = await repo.assigned_pairs([user.id for user in users], list(free))
+        # Соединение с БД не держим, пока идут запросы к панелям
+        await db.commit()
+
+        # Раскладываем по целевым серверам с наибольшим запасом; на первом неразмещаемом останавливаемся,
+        # чтобы курсор не перескочил через него
+        plan = {target.id: [] for target in targets}
+        already = []
+        batch = []
+        full = False
+        for user in users:
+            if any((user.id, target_id) in pairs for target_id in free):
+                already.append(user)
+            else:
+                target_id = max(free, key=lambda server_id: free[server_id])
+                if user.id in holding:
+                    if free[target_id] <= 0:
+                        full = True
+                        break
+                    free[target_id] -= 1
+                plan[target_id].append(user)
+            batch.append(user)
+        if not batch:
+            await repo.set_status(job.id, 'paused', "На целевых серверах нет свободных мест")
+            return False
+
+        # Места занимаем до создания клиентов: условный UPDATE не даст превысить max_users,
+        # даже если параллельно на эти серверы кого-то добавили
+        server_repo = ServerRepository(db)
+        targets_by_id = {target.id: target for target in targets}
+        reserved = {}
+        try:
+            lost = []
+            for target_id, planned in plan.items():
+                active = [user for user in planned if user.id in holding]
+                if not active:
+                    continue
+                if await server_repo.reserve_count(target_id, len(active)):
+                    reserved[target_id] = len(active)
+                    placement.apply(target_id, len(active))
+                else:
+                    lost.extend(active)
+            if lost:
+                # Места заняли параллельно: пачку обрезаем перед первым неразмещённым, остальное — в следующей
+                batch = batch[:batch.index(min(lost, key=batch.index))]
+                kept = {user.id for user in batch}
+                plan = {target_id: [user for user in planned if user.id in kept] for target_id, planned in plan.items()}
+                already = [user for user in already if user.id in kept]
+                full = False
+
+            failures = await asyncio.gather(*(
+                self.provision_target(targets_by_id[target_id], planned, existing)
+                for target_id, planned in plan.items() if planned
+            ))
+            failed_ids = set().union(*failures)
+            placed = {
+                target_id: [user.id for user in planned if user.id not in failed_ids]
+                for target_id, planned in plan.items()
+            }
+            # Назначения фиксируем до удаления с источника: при сбое пользователь останется на обоих серверах,
+            # а не потеряет доступ. Неиспользованный резерв освобождается в той же транзакции
+            deltas = await repo.assign_batch(placed, reserved, holding)
+        except BaseException:
+            # Ошибка или остановка до назначений — резерв возвращаем, клиентов на панели подхватит повтор пачки
+            await db.rollback()
+            await server_repo.release_counts(reserved)
+            for server_id, count in reserved.items():
+                placement.apply(server_id, -count)
+            raise
+        for server_id, delta in deltas.items():
+            placement.apply(server_id, delta)
+        if not batch:
+            return True
+
+        error = None
+        released = []
+        if job.mode == 'move':
+            released = [user.id for user in already] + [user_id for user_ids in placed.values() for user_id in user_ids]
+            if released and state["source_reachable"]:
+                results = await get_driver(source).remove_many(source, released, self.panel_concurrency)
+                if all(result is not None for result in results):
+                    # Источник недоступен: переносим назначения без удаления, чтобы не ждать таймаутов на каждом
+                    state["source_reachable"] = False
+                    error = f"Сервер {source.id} недоступен, клиенты остались на его панели: {results[0]}"
+                elif any(result is not None for result in results):
+                    error = f"Не удалось удалить с сервера {source.id}: {sum(result is not None for result in results)}"
+            elif released:
+                error = f"Сервер {source.id} недоступен, клиенты остались на его панели"
+        if failed_ids:
+            error = f"Не удалось создать на целевых серверах: {len(failed_ids)}" + (f"; {error}" if error else "")
+
+        removed = await repo.finish_batch(
+            job, released, holding, batch[-1].id, len(batch) - len(failed_ids), len(failed_ids), self.lease, error
+        )
+        if removed:
+            placement.apply(source.id, -removed)
+        for user in batch:
+            subscription_documents.invalidate(user.id)
+
+        if full:
+            await repo.set_status(job.id, 'paused', "На целевых серверах закончились свободные места")
+            return False
+        return True
+
+    def describe(self, job) -> str:
+        return f"Запущена задача переноса {job.id}: сервер {job.source_server_id} -> {job.target_server_ids}"
+
+    async def start(self, db, job):
+        server_repo = ServerRepository(db)
+        source = await server_repo.get_server_by_id(job.source_server_id)
+        targets = [target for target in await server_repo.get_server_by_id(list(job.target_server_ids)) or []
+                   if target.id != job.source_server_id]
+        if not source or not targets:
+            await RebalanceRepository(db).set_status(job.id, 'paused', "Сервер-источник или целевые серверы не найдены")
+            return None
+        return {"source": source, "targets": targets, "existing": {}, "state": {"source_reachable": True}}
+
+    async def step(self, db, current, context) -> bool:
+        print(f"Задача переноса {current.id}: обработано {current.processed}, ошибок {current.failed}")
+        return await self.run_batch(
+            db, current, context["source"], context["targets"], context["existing"], context["state"]
+        )
+
+rebalancer = RebalanceRunner(
+    settings.REBALANCE_BATCH_SIZE,
+    settings.REBALANCE_PANEL_CONCURRENCY,
+    settings.PROVISION_CHUNK_SIZE,
+    settings.REBALANCE_LEASE,
+    settings.REBALANCE_POLL_INTERVAL,
+)
@@ -0,0 +1,99 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import and_, bindparam, func, select
+from app.database.models.models import Server, User, UserServer
+from app.services.fanout import fan_out
+from app.services.placement import placement
+from app.services.vpn import VPNService
+
+
+@dataclass
+class Discrepancy:
+    """Расхождение счётчика current_users с реальными назначениями"""
+    server_id: int
+    stored: int
+    actual: int
+    panel: int | None = None
+
+    @property
+    def delta(self) -> int:
+        return self.actual - self.stored
+
+
+class CapacityReconciler:
+    """Пересчитывает Server.current_users по активным назначениям в user_servers"""
+
+    def __init__(self, with_panel: bool = False):
+        self.with_panel = with_panel
+        # Расхождения прошлого цикла: исправляем только повторившиеся, чтобы не затирать
+        # места, зарезервированные регистрацией, которая ещё не записала назначение
+        self._previous: dict[int, int] = {}
+
+    async def collect(self, db) -> list[Discrepancy]:
+        # Один агрегирующий запрос на весь парк серверов
+        result = await db.execute(
+            select(Server.id, Server.current_users, func.count(User.id))
+            .select_from(Server)
+            .outerjoin(UserServer, UserServer.server_id == Server.id)
+            .outerjoin(User, and_(
+                User.id == UserServer.user_id,
+                User.status == 'active',
+                User.subscription_end > datetime.utcnow(),
+            ))
+            .group_by(Server.id)
+        )
+        return [
+            Discrepancy(server_id, stored or 0, actual)
+            for server_id, stored, actual in result.all()
+            if (stored or 0) != actual
+        ]
+
+    async def attach_panel_counts(self, db, discrepancies: list[Discrepancy]):
+        servers = await db.execute(select(Server).where(Server.id.in_([d.server_id for d in discrepancies])))
+        servers = servers.scalars().all()
+        # Соединение с БД не держим, пока идут запросы к панелям (до таймаута fan_out)
+        await db.commit()
+        results = await fan_out(servers, VPNService.count_clients)
+        counts = {result.server_id: result.value for result in results if result.ok}
+        for discrepancy in discrepancies:
+            discrepancy.panel = counts.get(discrepancy.server_id)
+
+    async def run_once(self, db) -> list[Discrepancy]:
+        discrepancies = await self.collect(db)
+        if discrepancies and self.with_panel:
+            await self.attach_panel_counts(db, discrepancies)
+
+        confirmed = [d for d in discrepancies if self._previous.get(d.server_id) == d.delta]
+        self._previous = {d.server_id: d.delta for d in discrepancies}
+
+        if confirmed:
+            # Сдвигаем счётчик на дельту, а не присваиваем, чтобы не потерять параллельные резервирования
+            servers = Server.__table__
+            await db.execute(
+                servers.update()
+                .where(servers.c.id == bindparam("server_id"))
+                .values(current_users=func.greatest(servers.c.current_users + bindparam("delta"), 0)),
+                [{"server_id": d.server_id, "delta": d.delta} for d in confirmed],
+            )
+            await db.commit()
+            for discrepancy in confirmed:
+                placement.apply(discrepancy.server_id, discrepancy.delta)
+
+        for discrepancy in discrepancies:
+            action = "исправлено" if discrepancy in confirmed else "ждём подтверждения"
+            panel = f", на панели {discrepancy.panel}" if discrepancy.panel is not None else ""
+            print(
+                f"Сервер {discrepancy.server_id}: в счётчике {discrepancy.stored}, "
+                f"по назначениям {discrepancy.actual}{panel} — {action}"
+            )
+        return confirmed
+
+    async def run_loop(self, session_pool, interval: float):
+        while True:
+            try:
+                async with session_pool() as db:
+                    await self.run_once(db)
+            except Exception as e:
+                print(f"Ошибка сверки загрузки серверов: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.bot.keyboards.user_keyboard import get_reminder_keyboard
+from app.core.config import settings
+from app.database.repositories.reminder_repo import ReminderRepository
+from app.services.broadcast import broadcaster
+
+
+def reminder_text(subscription_end: datetime, now: datetime) -> str:
+    days = max(1, round((subscription_end - now).total_seconds() / 86400))
+    return (
+        "⏳ <b>Подписка скоро закончится</b>\n\n"
+        f"Осталось дней: <b>{days}</b> — до {subscription_end.strftime('%d.%m.%Y')}.\n"
+        "Продлите её заранее, чтобы VPN не отключился."
+    )
+
+
+class ReminderScheduler:
+    """Напоминания о конце подписки: куча ближайших в памяти, из БД читается только окно REMINDER_WINDOW"""
+
+    def __init__(self, window: float, batch_size: int):
+        self.window = timedelta(seconds=window)
+        self.batch_size = batch_size
+        self.horizon: datetime | None = None  # До этого момента куча содержит все напоминания
+        self.reload_at: datetime | None = None
+        self._heap: list[tuple[datetime, object]] = []
+        self._due: dict = {}  # user_id -> актуальное время; записи кучи с другим временем устарели
+        self._pending: dict | None = None  # Изменения, пришедшие во время загрузки окна
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def update(self, user_id, fire_at: datetime | None):
+        """Изменение после commit; вызывается из after_commit"""
+        if self._pending is not None:
+            self._pending[user_id] = fire_at
+        self._apply(user_id, fire_at)
+
+    def _apply(self, user_id, fire_at: datetime | None):
+        if fire_at is None or self.horizon is None or fire_at > self.horizon:
+            # Дальние напоминания подхватит следующая загрузка окна
+            self._due.pop(user_id, None)
+            return
+        self._due[user_id] = fire_at
+        heapq.heappush(self._heap, (fire_at, user_id))
+        if self._heap[0] == (fire_at, user_id):
+            self._wakeup.set()
+
+    async def load_window(self, db, now: datetime):
+        horizon = now + self.window
+        self._pending = {}
+        try:
+            rows = await ReminderRepository(db).due_before(horizon)
+            await db.commit()
+        except BaseException:
+            self._pending = None
+            raise
+        self.horizon = horizon
+        # Окно перечитываем с перекрытием, чтобы напоминание у границы не проскочило между загрузками
+        self.reload_at = now + self.window / 2
+        self._due = dict(rows)
+        self._heap = [(fire_at, user_id) for user_id, fire_at in rows]
+        heapq.heapify(self._heap)
+        # Изменения, зафиксированные во время запроса, новее прочитанного
+        pending, self._pending = self._pending, None
+        for user_id, fire_at in pending.items():
+            self._apply(user_id, fire_at)
+
+    def pop_due(self, now: datetime) -> list[tuple]:
+        entries = []
+        while self._heap and self._heap[0][0] <= now and len(entries) < self.batch_size:
+            fire_at, user_id = heapq.heappop(self._heap)
+            if self._due.get(user_id) == fire_at:
+                del self._due[user_id]
+                entries.append((user_id, fire_at))
+        return entries
+
+    async def fire_due(self, db, bot, now: datetime) -> int:
+        """Отправляет наступившие напоминания одной пачкой; возвращает размер пачки"""
+        entries = self.pop_due(now)
+        if not entries:
+            return 0
+        # Дату в БД могли поменять в другом процессе: claim отправит только тем, у кого она совпала
+        claimed = await ReminderRepository(db).claim(entries, now)
+        keyboard = get_reminder_keyboard()
+        # Общий с рассылками лимит скорости Telegram
+        results = await asyncio.gather(*(
+            broadcaster.send(bot, telegram_id, reminder_text(subscription_end, now), keyboard)
+            for _, telegram_id, subscription_end in claimed
+        ))
+        sent = sum(1 for outcome, _ in results if outcome == "sent")
+        print(f"Напоминания о подписке: отправлено {sent} из {len(claimed)}")
+        return len(entries)
+
+    def next_wakeup(self, now: datetime) -> float:
+        moments = [self.reload_at] if self.reload_at else []
+        if self._heap:
+            moments.append(self._heap[0][0])
+        if not moments:
+            return self.window.total_seconds()
+        return max(0.0, (min(moments) - now).total_seconds())
+
+    async def run_loop(self, session_pool, bot):
+        while True:
+            try:
+                async with session_pool() as db:
+                    now = datetime.utcnow()
+                    if self.reload_at is None or now >= self.reload_at:
+                        await self.load_window(db, now)
+                    while await self.fire_due(db, bot, datetime.utcnow()):
+                        pass
+            except Exception as e:
+                print(f"Ошибка отправки напоминаний: {e}")
+                await asyncio.sleep(5)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.next_wakeup(datetime.utcnow()))
+            except asyncio.TimeoutError:
+                pass
+
+
+reminder_scheduler = ReminderScheduler(settings.REMINDER_WINDOW, settings.REMINDER_BATCH_SIZE)
+
+
+@event.listens_for(Session, "after_commit")
+def _update_reminders(session):
+    # Новые даты попадают в кучу сразу после фиксации, без опроса таблицы
+    changed = session.info.pop("reminders_changed", None)
+    if changed:
+        for user_id, fire_at in changed.items():
+            reminder_scheduler.update(user_id, fire_at)
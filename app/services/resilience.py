@@ -0,0 +1,124 @@
+import asyncio
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """Запрос не отправлен: панель недавно падала, автомат разомкнут"""
+
+
+class PanelBusyError(Exception):
+    """Запрос не отправлен: очередь к панели переполнена или не дождались слота"""
+
+
+class CircuitBreaker:
+    """Автомат на сервер: после серии ошибок отклоняет запросы сразу, через reset_timeout пропускает один пробный"""
+
+    def __init__(self, server_id: int, failure_threshold: int, reset_timeout: float):
+        self.server_id = server_id
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"  # closed, open или half_open
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+
+    def before_call(self):
+        if self.state == "closed":
+            return
+        if self.state == "open":
+            retry_in = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if retry_in > 0:
+                raise CircuitOpenError(f"Панель сервера {self.server_id} отключена, повтор через {retry_in:.0f} с")
+            self.state = "half_open"
+        # В полуоткрытом состоянии пропускаем только один пробный запрос
+        if self._trial:
+            raise CircuitOpenError(f"Панель сервера {self.server_id} проверяется пробным запросом")
+        self._trial = True
+
+    def record_success(self):
+        if self.state != "closed":
+            print(f"Панель сервера {self.server_id} снова отвечает")
+        self.state = "closed"
+        self.failures = 0
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"Панель сервера {self.server_id} отключена после {self.failures} ошибок")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._trial = False
+
+    def abandon(self):
+        """Запрос отменён до результата — пробный слот освобождается без вердикта"""
+        self._trial = False
+
+
+class AdaptiveLimiter:
+    """Лимит одновременных запросов к панели (AIMD) с очередью FIFO: +1/limit после успеха, вдвое меньше при перегрузке"""
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, queue_limit: int, cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_limit = queue_limit
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    async def acquire(self, timeout: float):
+        while self._waiters and self._waiters[0].done():
+            self._waiters.popleft()
+        # Без очереди занимаем слот сразу; при очереди встаём в конец, чтобы не обгонять ждущих
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        if self.queued >= self.queue_limit:
+            raise PanelBusyError(f"Очередь к панели переполнена ({self.queue_limit})")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот выдали одновременно с таймаутом (wait_for на asyncio.timeout в 3.12+) — он уже наш
+                return
+            raise PanelBusyError(f"Не дождались свободного слота к панели за {timeout:.0f} с") from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот выдали одновременно с отменой — возвращаем его следующему
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self):
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    def on_overload(self):
+        # Одна волна таймаутов уменьшает лимит один раз, а не на каждый запрос из неё
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit / 2)
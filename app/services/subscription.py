@@ -1,21 +1,23 @@
-import asyncio
 from app.database.repositories.user_repo import UserRepository
 from app.database.repositories.server_repo import ServerRepository
-from app.database.connection import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from app.services.vpn import VPNService
+from app.services.placement import placement
 from aiogram.utils.markdown import hlink
+from app.web.subscription import subscription_url
 
 class SubscriptionService:
-    def __init__(self):
-        self.db = next(get_db())
+    def __init__(self, db: AsyncSession):
+        # Сессия принадлежит апдейту: её открывает и закрывает DbSessionMiddleware
+        self.db = db
         self.user_repo = UserRepository(self.db)
         self.server_repo = ServerRepository(self.db)
 
 
     async def get_subscription_status(self, telegram_id: int) -> dict:
-        user = self.user_repo.get_user(telegram_id)
+        user = await self.user_repo.get_user(telegram_id)
         if not user or not user.subscription_end:
             return {
                 "active": False,
@@ -29,66 +31,103 @@ class SubscriptionService:
         }
     
     async def get_user_by_telegram_id(self, telegram_id: int):
-        user = self.user_repo.get_user(telegram_id)
+        user = await self.user_repo.get_user(telegram_id)
         return user
 
-    async def extend_subscription(self, telegram_id: int, months: int):
-        user = self.user_repo.get_user(telegram_id)
+    async def restore_servers(self, user) -> list[int]:
+        """Занимает места на серверах, где у пользователя уже есть клиент; вызывается при возврате доступа"""
+        server_ids = await self.get_user_server_ids(user)
+        # Места заняты только у активных: при истечении их освобождает ExpirySweeper
+        if not server_ids:
+            return server_ids
+        reserved = await self.server_repo.reserve_slots(server_ids)
+        for server_id in reserved:
+            placement.apply(server_id, 1)
+        full = [server_id for server_id in server_ids if server_id not in reserved]
+        if full:
+            # Клиент на заполненном сервере остаётся отключённым; назначение снимаем, чтобы не превысить max_users
+            print(f"Серверы {full} заполнены, пользователь {user.id} переносится на другие")
+            await self.server_repo.unassign_servers(user.id, full)
+        return reserved
 
-        if not user:
-             return "Произошла ошибка при продлении подписки. Обратитесь в тех. поддержку."
-        
-        current_expiration = user.subscription_end
+    async def provision(self, user, months: int) -> list[int]:
+        """Создаёт клиента на наименее загруженном сервере каждой страны и назначает эти серверы"""
+        # Дата для панели предварительная: точную запишет update_subscription, а воркер очереди её синхронизирует
+        current_expiration = max(user.subscription_end or datetime.utcnow(), datetime.utcnow())
         new_expiration = current_expiration + relativedelta(months=months)
-        self.user_repo.update_subscription(telegram_id, new_expiration)
-        await asyncio.to_thread(VPNService.syns_user, user)
-        text = f"<b>Подписка успешно продлена!</b> 🎉\n\nТеперь она активна до - {new_expiration.strftime('%d-%m-%Y')}.\n\nБлагодарим, что остаетесь с нами! ❤️"
-        return text
-    
-    async def pay_subscription(self, telegram_id: int, months: int):
-        user = self.user_repo.get_user(telegram_id)
-        if not user:
-            return "Произошла ошибка при оплате подписки. Обратитесь в тех. поддержку."
-        
-        current_expiration = user.subscription_end if user.subscription_end else datetime.utcnow()
-        new_expiration = datetime.combine(current_expiration, datetime.min.time()) + relativedelta(months=months)
-        
+
         user_data = {
             "id": user.id,
             "username": user.username,
             "tgId": user.telegram_id,
             "subscription_end": new_expiration.strftime("%Y-%m-%d")
         }
-        
-        status, server_id = VPNService.add_vpn_user(user_data)
-        
-        if status:
-            user.subscription_end = new_expiration
-            user.server_id = server_id
-            user.status = 'active'
-            self.db.commit()
-            
-            # Обновляем количество пользователей на сервере
-            self.server_repo.update_server_users(server_id)
-            
-            await asyncio.to_thread(VPNService.syns_user, user)
-            url = f"https://ronix-red.ru/{user.id}"
+
+        results = await VPNService.add_vpn_user(self.db, user_data)
+        server_ids = [result.server_id for result in results if result.ok]
+        # Места на серверах уже зарезервированы в VPNService.add_vpn_user
+        await self.server_repo.assign_servers(user.id, server_ids)
+        return server_ids
+
+    async def renew(self, telegram_id: int, months: int) -> datetime | None:
+        """Продление или оплата с возвратом доступа; возвращает новую дату или None при ошибке
+
+        Вернувшемуся пользователю места занимаются на его прежних серверах: клиент там уже есть,
+        повторный addClient панель отклонит. Новые клиенты создаются, только если серверов нет."""
+        user = await self.user_repo.get_user(telegram_id, fresh=True)
+        if not user or user.status == 'blocked':
+            # Заблокированному доступ возвращает только администратор
+            await self.db.rollback()
+            return None
+
+        previous = user.status
+        # Места занимает и клиентов создаёт только тот, кто перевёл пользователя в active: двойное нажатие
+        # «оплатить» или /extend параллельно с оплатой иначе заняли бы места дважды
+        if previous != 'active' and await self.user_repo.claim_activation(user):
+            server_ids = await self.restore_servers(user)
+            if not server_ids:
+                server_ids = await self.provision(user, months)
+            if not server_ids:
+                await self.user_repo.release_activation(user, previous)
+                return None
+        # Дата фиксируется вместе с задачей очереди: воркер включит клиентов на панелях
+        return await self.user_repo.update_subscription(telegram_id, months)
+
+    async def extend_subscription(self, telegram_id: int, months: int):
+        new_expiration = await self.renew(telegram_id, months)
+        if not new_expiration:
+            return "Произошла ошибка при продлении подписки. Обратитесь в тех. поддержку."
+        text = f"<b>Подписка успешно продлена!</b> 🎉\n\nТеперь она активна до - {new_expiration.strftime('%d-%m-%Y')}.\n\nБлагодарим, что остаетесь с нами! ❤️"
+        return text
+    
+    async def pay_subscription(self, telegram_id: int, months: int):
+        new_expiration = await self.renew(telegram_id, months)
+        if new_expiration:
+            user = await self.user_repo.get_user(telegram_id)
+            url = subscription_url(user.id)
             
             return f"<b>Ваша конфигурация успешно создана! 🎉</b>\n\n🔗 Нажми на ссылку, чтобы импортировать конфиг в Hiddify:\n\n<a href='{url}'>Нажми на меня</a>"
         
         return "Произошла ошибка при создании конфигурации. Обратитесь в тех. поддержку."
 
+    async def get_user_server_ids(self, user) -> list[int]:
+        servers = await self.server_repo.get_user_servers(user.id)
+        return [server.id for server in servers]
+
     async def add_user(self, telegram_id: int, username: str | None):
-        return self.user_repo.add_user(telegram_id, username)
+        return await self.user_repo.add_user(telegram_id, username)
 
     async def check_free_server(self):
-        return self.server_repo.get_free_server()
+        if placement.loaded:
+            server_id = placement.pick()
+            return await self.server_repo.get_server_by_id(server_id) if server_id else None
+        return await self.server_repo.get_free_server()
     
     async def get_configuration(self, telegram_id: int):
-        user = self.user_repo.get_user(telegram_id)
+        user = await self.user_repo.get_user(telegram_id)
         if not user:
             return "Произошла ошибка при получении конфигурации. Обратитесь в тех. поддержку."
-        url = f"https://ronix-red.ru/api/user-data.php?userId={user.id}"
+        url = subscription_url(user.id)
         text = f"<b>Вот ваша конфигурация 😎</b>\n\n🔗 Нажми на ссылку, чтобы импортировать конфиг в Hiddify:\n\n{url}\n\nИспользуйте её для подключения. Если что-то не работает, свяжитесь с поддержкой."
 
         return text
\ No newline at end of file
@@ -1,238 +1,86 @@
-import urllib3
-import json
-import requests
-from datetime import datetime
-from urllib.parse import quote_plus
-from app.database.connection import get_db
 from app.database.repositories.server_repo import ServerRepository
-
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from app.services.panels.registry import get_driver
+from app.services.fanout import fan_out
+from app.services.placement import placement
 
 class VPNService:
     @staticmethod
-    def get_auth_token(server):
-        """Получение токена авторизации для сервера"""
+    async def find_api_url(db):
         try:
-            login_url = f"{server.server_address}:{server.server_port}/{server.server_sub}/login"
-            login_payload = {
-                "username": server.login,
-                "password": server.password
-            }
-            
-
-            login_response = requests.post(login_url, json=login_payload, timeout=30, verify=False)
-            
-            if login_response.status_code == 200:
-                token = login_response.cookies.get('3x-ui')
-                if not token:
-                    raise ValueError("Авторизация успешна, но токен не получен")
-                return token
-            else:
-                raise Exception(f"Ошибка авторизации: {login_response.status_code, login_response.text}")
-                
-        except Exception as e:
-            print(f"Ошибка при получении токена: {e}")
-            raise
-
-    @staticmethod
-    def find_api_url():
-        try:
-            db = next(get_db())
             server_repo = ServerRepository(db)
-            servers = server_repo.get_two_different_country_servers()
+            if placement.loaded:
+                # Выбор по снимку загрузки в памяти, из БД читаем только выбранные строки
+                server_ids = placement.pick_per_country()
+                servers = await server_repo.get_server_by_id(server_ids) if server_ids else []
+            else:
+                servers = await server_repo.get_two_different_country_servers()
             if not servers:
                 print("Servers not found")
                 return None
 
-            # Получаем токены для обоих серверов
-            tokens = []
-            for server in servers:
-                token = VPNService.get_auth_token(server)
-                tokens.append((token, server))
-            
-            return tokens
+            return servers
 
         except Exception as e:
             print(f"Error working with database or servers: {e}")
             return None
 
     @staticmethod
-    def add_vpn_user(user_data):
-        results = VPNService.find_api_url()
-        if not results:
-            return None, "No available servers"
-        
-        server_id = []
-        for token, server in results:
-            email = user_data.get("username")
-            uuid = str(user_data.get("id"))
-            tg_id = user_data.get("tgId")
-            subscription_end = datetime.strptime(user_data.get("subscription_end"), "%Y-%m-%d").timestamp() * 1000
-
-            url = f"{server.server_address}:{server.server_port}/{server.server_sub}/panel/api/inbounds/addClient"
-            headers = {
-                "Accept": "application/json",
-                "Content-Type": "application/json",
-                "Cookie": f"3x-ui={token}"
-            }
+    async def add_client(server, user_data):
+        """Добавляет клиента на один сервер через драйвер его панели; при ошибке бросает исключение"""
+        await get_driver(server).provision(server, user_data)
 
-            settings_data = {
-                "clients": [
-                    {
-                        "id": uuid,
-                        "flow": "xtls-rprx-vision",
-                        "email": email,
-                        "limitIp": 3,
-                        "totalGB": 0,
-                        "expiryTime": subscription_end,
-                        "enable": True,
-                        "tgId": tg_id,
-                    }
-                ]
-            }
-
-            payload = {
-                "id": 1,
-                "settings": json.dumps(settings_data)
-            }
-
-            try:
-                response = requests.post(url, headers=headers, json=payload, verify=False)
-                if response.status_code == 200:
-                    print(f"Пользователь успешно добавлен на VPN сервер {server.id}.")
-                    server_id.append(server.id)
-                else:
-                    print(f"Ошибка при добавлении пользователя на сервер {server.id}: {response.status_code} - {response.text}")
-                    return None, response.text
-            except Exception as e:
-                print(f"Ошибка при отправке запроса на сервер {server.id}: {e}")
-                return None, str(e)
+    @staticmethod
+    async def add_vpn_user(db, user_data):
+        """Резервирует места и добавляет пользователя на серверы всех стран параллельно, возвращает результат по каждому серверу"""
+        servers = await VPNService.find_api_url(db)
+        if not servers:
+            return []
 
-        return 200, server_id
+        # Сначала атомарно занимаем места, чтобы параллельные регистрации не переполнили сервер
+        server_repo = ServerRepository(db)
+        reserved = set(await server_repo.reserve_slots([server.id for server in servers]))
+        for server in servers:
+            if server.id in reserved:
+                placement.apply(server.id, 1)
+            else:
+                print(f"Сервер {server.id} заполнен параллельной регистрацией, пропускаем")
+                placement.mark_full(server.id)
+        servers = [server for server in servers if server.id in reserved]
+
+        results = await fan_out(servers, lambda server: VPNService.add_client(server, user_data))
+        failed = [result.server_id for result in results if not result.ok]
+        for result in results:
+            if not result.ok:
+                print(f"Ошибка при добавлении пользователя на сервер {result.server_id}: {result.error}")
+        # Места на серверах, где клиента создать не удалось, возвращаем
+        for server_id in await server_repo.release_slots(failed):
+            placement.apply(server_id, -1)
+        return results
 
     @staticmethod
-    def generate_vpn_url(uuid, server_id):
+    async def generate_vpn_url(db, uuid, server_id):
         try:
-            db = next(get_db())
             server_repo = ServerRepository(db)
-            server = server_repo.get_server_by_id(server_id)
+            server = await server_repo.get_server_by_id(server_id)
             if not server:
                 raise ValueError(f"Server not found: {server_id}")
 
-            token = VPNService.get_auth_token(server)
-
-            # Получаем данные конфигурации
-            url = f"{server.server_address}:{server.server_port}/{server.server_sub}/panel/api/inbounds/get/1"
-            headers = {
-                "Accept": "application/json",
-                "Content-Type": "application/json",
-                "Cookie": f"3x-ui={token}"
-            }
-
-            response = requests.get(url, headers=headers, verify=False)
-            if response.status_code != 200:
-                raise Exception(f"Error while fetching data: {response.status_code}")
-
-            data = response.json()
-            client_data = data["obj"]["settings"]
-            clients = json.loads(client_data)["clients"]
-            obj_data = data["obj"]["streamSettings"]
-            stream_data = json.loads(obj_data)["realitySettings"]
-
-            client = next((client for client in clients if client["id"] == str(uuid)), None)
-            if not client:
+            # Наличие клиента подтверждаем по своей БД, а не по списку клиентов панели
+            if not await server_repo.is_assigned(uuid, server.id):
                 raise ValueError(f"Client with UUID {uuid} not found")
 
-            # Формируем URL для подключения
-            flow = client["flow"]
-            pbk = stream_data["settings"]["publicKey"]
-            sni = stream_data["serverNames"][0]
-            sid = stream_data["shortIds"][0]
-            remark = client.get("remark", "RONIX-VPN")
-            domain = server.server_address.replace("https://", "")
-
-            vless_url = f"vless://{uuid}@{domain}:443?type=tcp&security=reality&pbk={quote_plus(pbk)}&fp=chrome&sni={quote_plus(sni)}&sid={sid}&spx=%2F&flow={flow}#{quote_plus(remark)}"
-
-            return vless_url
+            return await get_driver(server).connection_url(server, uuid)
 
         except Exception as e:
             print(f"Error generating VPN URL: {e}")
             return None
 
     @staticmethod
-    def get_server_from_id(server_id):
-        db = next(get_db())
-        server_repo = ServerRepository(db)
-        server = server_repo.get_server_by_id(server_id)
-        if server:
-            return server
-        raise ValueError(f"Server not found: {server_id}")
-    
-    @staticmethod
-    def syns_user(user):
-        try:
-            if not hasattr(user, "server_id") or not user.server_id:
-                raise KeyError("server_id")
-
-            db = next(get_db())
-            server_repo = ServerRepository(db)
-            
-            # Преобразуем строку server_id в список
-            if isinstance(user.server_id, str):
-                # Убираем фигурные скобки и пробелы, затем разбиваем по запятой
-                server_ids = [int(x.strip()) for x in user.server_id.strip('{}').split(',') if x.strip()]
-            elif isinstance(user.server_id, list):
-                server_ids = user.server_id
-            else:
-                server_ids = [user.server_id]
-            
-            results = []
-            for server_id in server_ids:
-                server = server_repo.get_server_by_id(server_id)
-                if not server:
-                    print(f"Warning: Server not found: {server_id}")
-                    continue
+    async def count_clients(server):
+        """Количество клиентов на панели сервера"""
+        return (await get_driver(server).fetch_stats(server)).clients
 
-                token = VPNService.get_auth_token(server)
-
-                # Обновляем данные пользователя
-                url = f"{server.server_address}:{server.server_port}/{server.server_sub}/panel/api/inbounds/updateClient/{user.id}"
-                headers = {
-                    "Accept": "application/json",
-                    "Content-Type": "application/json",
-                    "Cookie": f"3x-ui={token}"
-                }
-
-                settings_data = {
-                    "clients": [
-                        {
-                            "id": str(user.id),
-                            "flow": "xtls-rprx-vision",
-                            "email": user.username,
-                            "limitIp": 3,
-                            "totalGB": 0,
-                            "expiryTime": int(user.subscription_end.timestamp() * 1000) if user.subscription_end else 0,
-                            "enable": user.status != "blocked",
-                            "tgId": user.telegram_id,
-                        }
-                    ]
-                }
-
-                payload = {
-                    "id": 1,
-                    "settings": json.dumps(settings_data)
-                }
-
-                response = requests.post(url, headers=headers, json=payload, verify=False)
-                if response.status_code == 200:
-                    print(f"User data successfully updated on server {server_id}")
-                    results.append({"server_id": server_id, "status": "success"})
-                else:
-                    print(f"Error updating user on server {server_id}: {response.status_code}")
-                    results.append({"server_id": server_id, "status": "error", "error": response.text})
-
-            return results
-
-        except Exception as e:
-            print(f"Error updating user: {e}")
-            raise
\ No newline at end of file
+    @staticmethod
+    async def update_client(server, user):
+        """Обновляет клиента на одном сервере через драйвер его панели; при ошибке бросает исключение"""
+        await get_driver(server).update(server, user)
@@ -0,0 +1,12 @@
+from aiohttp import web
+from app.core.config import settings
+
+
+async def start_web_server(app: web.Application) -> web.AppRunner:
+    """Запускает локальный aiohttp-сервер; остановка через runner.cleanup()"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.WEB_HOST, port=settings.WEB_PORT)
+    await site.start()
+    print(f"HTTP-сервер запущен на {settings.WEB_HOST}:{settings.WEB_PORT}")
+    return runner
@@ -0,0 +1,125 @@
+import asyncio
+import base64
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from aiohttp import web
+from app.core.config import settings
+from app.database.models.models import User
+from app.database.repositories.server_repo import ServerRepository
+from app.services.panels.registry import get_driver
+
+
+def subscription_url(user_id) -> str:
+    """Публичная ссылка на подписку пользователя"""
+    return f"{settings.SUBSCRIPTION_BASE_URL.rstrip('/')}{settings.SUBSCRIPTION_PATH}/{user_id}"
+
+
+@dataclass
+class SubscriptionDocument:
+    """Готовый ответ подписки: тело, заголовки и ETag"""
+    body: bytes
+    etag: str
+    headers: dict[str, str]
+    expires_at: float
+
+
+class SubscriptionDocuments:
+    """LRU-кэш документов подписки в памяти процесса: повторный запрос с тем же ETag не трогает БД и панели"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[uuid.UUID, SubscriptionDocument] = OrderedDict()
+
+    def peek(self, user_id: uuid.UUID) -> SubscriptionDocument | None:
+        document = self._entries.get(user_id)
+        if document is None:
+            return None
+        if document.expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return document
+
+    def put(self, user_id: uuid.UUID, document: SubscriptionDocument):
+        self._entries[user_id] = document
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self._entries.pop(user_id, None)
+
+    async def render(self, db, user_id: uuid.UUID) -> SubscriptionDocument | None:
+        user = await db.get(User, user_id)
+        if user is None:
+            return None
+
+        links = []
+        if user.status == "active":
+            servers = await ServerRepository(db).get_user_servers(user.id)
+            # Драйверы строят ссылки из кэша; при холодном кэше серверы опрашиваются параллельно
+            urls = await asyncio.gather(
+                *(get_driver(server).connection_url(server, user.id, f"RONIX-VPN {server.country}") for server in servers),
+                return_exceptions=True
+            )
+            for server, url in zip(servers, urls):
+                if isinstance(url, Exception):
+                    print(f"Ошибка получения параметров сервера {server.id} для подписки: {url}")
+                    continue
+                links.append(url)
+
+        body = base64.b64encode("\n".join(links).encode())
+        expire = int(user.subscription_end.timestamp()) if user.subscription_end else 0
+        headers = {
+            "Content-Type": "text/plain; charset=utf-8",
+            "Cache-Control": f"private, max-age={int(self.ttl)}",
+            "Profile-Title": "RONIX-VPN",
+            "Profile-Update-Interval": str(settings.SUBSCRIPTION_UPDATE_INTERVAL),
+            "Subscription-Userinfo": f"upload=0; download=0; total=0; expire={expire}",
+        }
+        etag = '"' + hashlib.sha256(body + str(expire).encode()).hexdigest()[:32] + '"'
+        return SubscriptionDocument(body, etag, headers, time.monotonic() + self.ttl)
+
+
+def etag_matches(request: web.Request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def document_response(request: web.Request, document: SubscriptionDocument) -> web.Response:
+    headers = {**document.headers, "ETag": document.etag}
+    if etag_matches(request, document.etag):
+        return web.Response(status=304, headers={
+            key: value for key, value in headers.items() if key != "Content-Type"
+        })
+    return web.Response(body=document.body, headers=headers)
+
+
+def setup_subscription(app: web.Application, session_pool):
+    async def handle(request: web.Request) -> web.Response:
+        try:
+            user_id = uuid.UUID(request.match_info["user_id"])
+        except ValueError:
+            raise web.HTTPNotFound()
+
+        # Горячий путь: документ в памяти — ни БД, ни панелей
+        document = subscription_documents.peek(user_id)
+        if document is None:
+            async with session_pool() as db:
+                document = await subscription_documents.render(db, user_id)
+            if document is None:
+                raise web.HTTPNotFound()
+            subscription_documents.put(user_id, document)
+        return document_response(request, document)
+
+    app.router.add_get(f"{settings.SUBSCRIPTION_PATH}/{{user_id}}", handle)
+
+
+subscription_documents = SubscriptionDocuments(settings.SUBSCRIPTION_CACHE_TTL, settings.SUBSCRIPTION_CACHE_SIZE)
@@ -2,10 +2,31 @@ import asyncio
 from aiogram import Bot, Dispatcher
 from app.core.config import settings
 from app.bot.handlers import user_handlers, user_callbacks, admin_panel
-from app.database.connection import init_db
+from app.database.connection import init_db, engine, AsyncSessionLocal
+from app.bot.middlewares.db import DbSessionMiddleware
+from app.services.panel_client import panel_clients
+from app.services.auth_cache import auth_tokens
+from app.services.placement import placement
+from app.services.reconciler import CapacityReconciler
+from app.services.expiry import ExpirySweeper
+from app.services.outbox import outbox_worker
+from app.services.rebalance import rebalancer
+from app.services.health import health_prober
+from app.services.broadcast import broadcaster
+from app.services.reminders import reminder_scheduler
+from app.bot.storage import DatabaseStorage
+from app.bot.webhook import run_webhook
+from app.web.server import start_web_server
+from app.web.subscription import setup_subscription
+from aiohttp import web
 from aiogram.fsm.storage.memory import MemoryStorage
 
 
+def create_storage():
+    if settings.FSM_STORAGE == "db":
+        return DatabaseStorage(AsyncSessionLocal, ttl=settings.FSM_TTL)
+    return MemoryStorage()
+
 def register_handlers(dp: Dispatcher):
     # Сначала регистрируем общие обработчики
     dp.include_router(user_handlers.router)
@@ -16,24 +37,71 @@ def register_handlers(dp: Dispatcher):
 
 async def main():
     # Инициализация базы данных
-    init_db()
+    await init_db()
+    # Восстанавливаем токены панелей, чтобы рестарт не вызывал волну логинов
+    auth_tokens.load()
     
     # Инициализация бота и диспетчера с хранилищем состояний
     bot = Bot(token=settings.TOKEN)
-    storage = MemoryStorage()
+    storage = create_storage()
     dp = Dispatcher(storage=storage)
 
+    # Фоновые задачи, которые нужно остановить при завершении
+    background_tasks = [
+        asyncio.create_task(placement.run_refresh_loop(AsyncSessionLocal, settings.PLACEMENT_REFRESH_INTERVAL)),
+        asyncio.create_task(health_prober.run_loop(AsyncSessionLocal, settings.HEALTH_PROBE_INTERVAL)),
+        asyncio.create_task(
+            CapacityReconciler(settings.RECONCILE_WITH_PANEL).run_loop(AsyncSessionLocal, settings.RECONCILE_INTERVAL)
+        ),
+        asyncio.create_task(
+            ExpirySweeper(
+                settings.EXPIRY_BATCH_SIZE, settings.EXPIRY_PANEL_CONCURRENCY, settings.EXPIRY_PUSH_TIMEOUT
+            ).run_loop(AsyncSessionLocal, settings.EXPIRY_SWEEP_INTERVAL)
+        ),
+        asyncio.create_task(outbox_worker.run_loop(AsyncSessionLocal)),
+        asyncio.create_task(rebalancer.run_loop(AsyncSessionLocal)),
+        asyncio.create_task(broadcaster.run_loop(AsyncSessionLocal, bot)),
+        asyncio.create_task(reminder_scheduler.run_loop(AsyncSessionLocal, bot)),
+    ]
+    if isinstance(storage, DatabaseStorage):
+        background_tasks.append(asyncio.create_task(storage.run_purge_loop(settings.FSM_PURGE_INTERVAL)))
+
+    # Одна сессия БД на апдейт: открывается до хендлеров и закрывается после них
+    dp.update.outer_middleware(DbSessionMiddleware(AsyncSessionLocal))
+
     # Регистрация обработчиков
     register_handlers(dp)
 
+    # Типы обновлений, которые мы хотим получать
+    allowed_updates = ["message", "callback_query"]
+
+    # HTTP-приложение: ссылки подписки, а в режиме webhook ещё и приём апдейтов
+    app = web.Application()
+    setup_subscription(app, AsyncSessionLocal)
+    runner = None
+
     try:
-        # Запуск поллинга
-        await dp.start_polling(bot, 
-            polling_timeout=30,  # Таймаут между запросами
-            allowed_updates=["message", "callback_query"],  # Типы обновлений, которые мы хотим получать
-        )
+        if settings.BOT_MODE == "webhook":
+            # Приём апдейтов через вебхук
+            await run_webhook(bot, dp, allowed_updates, app)
+        else:
+            runner = await start_web_server(app)
+            # Запуск поллинга (вебхук, если был выставлен, снимаем)
+            await bot.delete_webhook()
+            await dp.start_polling(bot, 
+                polling_timeout=30,  # Таймаут между запросами
+                allowed_updates=allowed_updates,
+            )
     finally:
-        # Гарантированное закрытие бота после остановки поллинга
+        if runner:
+            await runner.cleanup()
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+
+        # Гарантированное закрытие бота и пулов соединений с панелями после остановки поллинга
+        await panel_clients.close()
+        await engine.dispose()
         await bot.close()
 
 
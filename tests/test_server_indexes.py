@@ -0,0 +1,94 @@
+"""Планы запросов выбора сервера: проверяются на отдельной тестовой PostgreSQL
+
+База задаётся явно через TEST_DATABASE_URL (postgresql+asyncpg://...), без неё тесты пропускаются.
+Схема и тестовые строки создаются в транзакции, которая откатывается: база остаётся как была."""
+import asyncio
+import os
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL не задан", allow_module_level=True)
+
+try:
+    from app.database.connection import Base
+    from app.database.models import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+    from app.database.repositories.server_repo import ServerRepository
+except Exception as e:  # нет настроек окружения (TOKEN, DB_*)
+    pytest.skip(f"Настройки приложения недоступны: {e}", allow_module_level=True)
+
+# Парк серверов, на котором видно выбор индекса: 20 стран, у большинства серверов есть места,
+# часть помечена недоступной
+SEED_SERVERS = """
+INSERT INTO servers (id, server_address, server_port, server_sub, current_users, max_users,
+                     login, password, api, country, is_healthy)
+SELECT 1000000 + n, 'https://test', 443, 'sub', n % 101, 100,
+       'login', 'password', 'api', 'country-' || (n % 20), n % 97 <> 0
+FROM generate_series(1, 20000) AS n
+"""
+
+
+class RecordingSession:
+    """Вместо запроса в БД запоминает оператор, который построил репозиторий"""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        raise LookupError
+
+
+async def repository_sql(method_name: str) -> str:
+    session = RecordingSession()
+    with pytest.raises(LookupError):
+        await getattr(ServerRepository(session), method_name)()
+    compiled = session.statements[0].compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    return str(compiled)
+
+
+async def explain(engine, sql: str) -> str:
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text(SEED_SERVERS))
+            await conn.execute(text("ANALYZE servers"))
+            rows = await conn.execute(text(f"EXPLAIN {sql}"))
+            return "\n".join(row[0] for row in rows)
+        finally:
+            # Схема, тестовые строки и статистика откатываются вместе с транзакцией
+            await transaction.rollback()
+
+
+def plan_for(method_name: str) -> str:
+    async def run():
+        engine = create_async_engine(TEST_DATABASE_URL, poolclass=NullPool)
+        try:
+            sql = await repository_sql(method_name)
+            try:
+                async with engine.connect():
+                    pass
+            except Exception as e:  # нет сервера, неверный пароль, нет базы
+                pytest.skip(f"PostgreSQL недоступен: {e}")
+            return await explain(engine, sql)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_free_server_uses_load_ratio_index():
+    plan = plan_for("get_free_server")
+    assert "ix_servers_load_ratio" in plan, plan
+
+
+def test_servers_per_country_use_country_load_ratio_index():
+    plan = plan_for("get_two_different_country_servers")
+    assert "ix_servers_country_load_ratio" in plan, plan